@@ -0,0 +1,70 @@
+import re
+import struct
+import subprocess
+
+import numpy as np
+
+from application.video.command_builder import FFmpegCommand
+from application.video.ffmpeg_runner import run_ffmpeg
+
+PEAKS_SAMPLE_RATE = 8000  # Mono PCM rate the peaks are computed from
+# Samples per min/max pair: 31.25 pairs, 62.5 bytes per second, about 11 KB for a 3 minute track.
+# Clients zoom out from this level themselves.
+SAMPLES_PER_PEAK = 256
+DAT_FLAG_8_BIT = 1
+
+# Summary that ebur128 logs when the input ends
+LOUDNESS_PATTERNS = {
+    "integrated": re.compile(r"^\s*I:\s+(-?[\d.]+|-inf) LUFS", re.MULTILINE),
+    "range": re.compile(r"^\s*LRA:\s+(-?[\d.]+) LU\b", re.MULTILINE),
+    "true_peak": re.compile(r"^\s*Peak:\s+(-?[\d.]+|-inf) dBFS", re.MULTILINE)
+}
+
+
+def parse_loudness(stderr):
+    """Integrated loudness (LUFS), loudness range (LU) and true peak (dBFS) from the ebur128 summary."""
+    loudness = {}
+    for key, pattern in LOUDNESS_PATTERNS.items():
+        matches = pattern.findall(stderr)
+        value = float(matches[-1]) if matches else None
+        # -inf (digital silence) isn't valid JSON
+        loudness[key] = value if value is None or np.isfinite(value) else None
+    return loudness
+
+
+def decode_and_measure(audio_file):
+    """Decode once: ebur128 measures the full-rate audio, and a mono PCM copy comes back on stdout."""
+    # The summary is logged at the info level; framelog keeps the per-frame lines below it
+    command = FFmpegCommand(loglevel="info").input(audio_file)
+    command.filter_complex(f"[0:a]ebur128=peak=true:framelog=verbose,"
+                           f"aresample={PEAKS_SAMPLE_RATE},aformat=sample_fmts=s16:channel_layouts=mono[pcm]")
+    command.output('pipe:1', '-map', '[pcm]', '-f', 's16le')
+    result = run_ffmpeg(command.build(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = result.stderr.decode(errors='replace')
+    if result.returncode != 0:
+        raise RuntimeError(f"Audio analysis failed for {audio_file}: {(stderr.strip().splitlines() or [''])[-1]}")
+    return np.frombuffer(result.stdout, dtype=np.int16), parse_loudness(stderr)
+
+
+def build_peaks(samples, samples_per_peak=SAMPLES_PER_PEAK):
+    """Min/max pairs of every samples_per_peak samples, scaled to 8 bits."""
+    if samples.size == 0:
+        return np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int8)
+    # Pad with the last sample so the final bucket isn't pulled towards zero
+    padded = np.pad(samples, (0, -samples.size % samples_per_peak), mode='edge').reshape(-1, samples_per_peak)
+    return (padded.min(axis=1) >> 8).astype(np.int8), (padded.max(axis=1) >> 8).astype(np.int8)
+
+
+def write_peaks(peaks_file, mins, maxs, sample_rate=PEAKS_SAMPLE_RATE, samples_per_peak=SAMPLES_PER_PEAK):
+    """Write the pairs in audiowaveform's binary .dat format (version 1, 8 bits), as used by peaks.js."""
+    header = struct.pack('<iIiiI', 1, DAT_FLAG_8_BIT, sample_rate, samples_per_peak, mins.size)
+    with open(peaks_file, 'wb') as f:
+        f.write(header)
+        f.write(np.column_stack((mins, maxs)).astype(np.int8).tobytes())
+
+
+def analyze_audio(audio_file, peaks_file):
+    """Write the peaks sidecar of an audio file and return its loudness; runs in the transcode pool."""
+    samples, loudness = decode_and_measure(audio_file)
+    write_peaks(peaks_file, *build_peaks(samples))
+    return loudness
@@ -0,0 +1,29 @@
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required
+
+from application.audio.library import track_to_dict
+from application.response import create_response
+from models import AudioTrack
+
+audio = Blueprint('audio', __name__)
+
+SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 200
+
+
+# Search the audio library by name and/or artist prefix, served by the name and artist prefix indexes
+@audio.route('/tracks', methods=['GET'])
+@jwt_required()
+def search_tracks():
+    name = request.args.get('name')
+    artist = request.args.get('artist')
+    limit = min(max(request.args.get('limit', SEARCH_LIMIT, type=int), 1), MAX_SEARCH_LIMIT)
+
+    query = AudioTrack.query
+    if name:
+        query = query.filter(AudioTrack.name.startswith(name, autoescape=True))
+    if artist:
+        query = query.filter(AudioTrack.artist.startswith(artist, autoescape=True))
+    tracks = query.order_by(AudioTrack.name, AudioTrack.id).limit(limit).all()
+    return create_response(message="Search tracks successfully", code=200,
+                           data=[track_to_dict(track) for track in tracks])
@@ -1,9 +1,22 @@
 import json
 import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-import firebase_admin
 import yt_dlp
-from firebase_admin import credentials, storage
+
+from application import tracing
+from application.audio.analysis import analyze_audio
+from application.audio.library import archive_id, is_local, known_tracks, local_path, save_track, source_id
+from application.factory import create_app
+from application.uploader import get_uploader
+from application.video.command_builder import FFmpegCommand
+from application.video.downloader import file_md5
+from application.video.ffmpeg_runner import run_ffmpeg
+from application.video.probe import run_ffprobe
+from config import Config
 
 
 # Load configuration from config.json
@@ -14,88 +27,209 @@ def load_config(config_file='config.json'):
 
 config = load_config()
 
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate(config['SERVICE_ACCOUNT_KEY_PATH'])
-FIREBASE_STORAGE_BUCKET_NAME = config['FIREBASE_STORAGE_BUCKET_NAME']
-
-firebase_admin.initialize_app(cred, {
-    'storageBucket': FIREBASE_STORAGE_BUCKET_NAME
-})
-
-
-def upload_to_firebase(local_file_path, firebase_path):
-    bucket = storage.bucket()
-
-    # Create new blob then upload the file
-    blob = bucket.blob(firebase_path)
-    blob.upload_from_filename(local_file_path)
+DOWNLOAD_CONCURRENCY = config.get('AUDIO_DOWNLOAD_CONCURRENCY', 4)  # Items fetched at once
+TRANSCODE_WORKERS = config.get('AUDIO_TRANSCODE_WORKERS', os.cpu_count() or 1)  # MP3 encodes at once
+AUDIO_QUALITY = '192'  # MP3 bitrate in kbit/s
 
-    # Make the blob publicly accessible
-    blob.make_public()
+_local = threading.local()
 
-    # Get the URL of the uploaded file
-    return blob.public_url
 
+def storage_options():
+    """Storage backend and Firebase settings from config.json; anything missing falls back to Config."""
+    options = {}
+    if 'SERVICE_ACCOUNT_KEY_PATH' in config:
+        options['credentials_path'] = config['SERVICE_ACCOUNT_KEY_PATH']
+    if 'FIREBASE_STORAGE_BUCKET_NAME' in config:
+        options['bucket_name'] = config['FIREBASE_STORAGE_BUCKET_NAME']
+    return options
 
-def download_audio(urls, output_path='outputs/audios', metadata_file='outputs/audio_metadata.json'):
-    """Function download audio base on url list."""
 
-    metadata_list = []
-
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'outtmpl': f'{output_path}/%(title)s.%(ext)s',
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
+def upload_to_firebase(local_file_path, firebase_path):
+    """Queue the upload on the shared uploader and return a Future for the public URL."""
+    backend = config.get('STORAGE_BACKEND', Config.STORAGE_BACKEND)
+    options = storage_options() if backend == 'firebase' else {}
+    uploader = get_uploader(backend, max_workers=config.get('UPLOAD_CONCURRENCY', 8), **options)
+    return uploader.submit(local_file_path, firebase_path)
+
+
+def get_ydl(output_path):
+    """One YoutubeDL per download thread, as instances are not thread-safe."""
+    ydl = getattr(_local, 'ydl', None)
+    if ydl is None or _local.output_path != output_path:
+        # No postprocessors: the MP3 encode runs in the transcode pool instead of blocking this thread.
+        # The id keeps concurrent downloads of tracks with the same title apart.
+        ydl = yt_dlp.YoutubeDL({'format': 'bestaudio/best', 'outtmpl': f'{output_path}/%(title)s [%(id)s].%(ext)s',
+                                'quiet': True, 'noprogress': True})
+        _local.ydl = ydl
+        _local.output_path = output_path
+    return ydl
+
+
+def fetch(source, output_path):
+    """Download a source once; returns its info dict and the downloaded file.
+
+    Local media files are used in place, with their tags as metadata.
+    """
+    if is_local(source):
+        path = local_path(source)
+        fmt = run_ffprobe(path).get('format', {})
+        tags = {key.lower(): value for key, value in fmt.get('tags', {}).items()}
+        info = {
+            "title": tags.get('title') or os.path.splitext(os.path.basename(path))[0],
+            "artist": tags.get('artist'),
+            "duration": float(fmt.get('duration') or 0)
+        }
+        return info, path, False
+
+    info = get_ydl(output_path).extract_info(source, download=True)
+    downloads = info.get('requested_downloads') or [{}]
+    return info, downloads[0].get('filepath') or get_ydl(output_path).prepare_filename(info), True
+
+
+def transcode_to_mp3(source_file, output_file, quality=AUDIO_QUALITY):
+    """Encode the audio of a file to MP3; runs in the transcode pool."""
+    command = FFmpegCommand().input(source_file).output(output_file, '-vn', '-c:a', 'libmp3lame',
+                                                        '-b:a', f"{quality}k")
+    run_ffmpeg(command.build(), check=True, stderr=subprocess.PIPE)
+    return output_file
+
+
+def prepare_track(source, key, output_path, transcodes):
+    """Download, transcode and analyse one source.
+
+    Returns its source id, metadata (without audio_url and peaks_url), MP3 file, MP3 hash and
+    peaks sidecar, which is None when the analysis failed.
+    """
+    with tracing.stage("download", source=source):
+        info, downloaded_file, downloaded = fetch(source, output_path)
+    if downloaded and info.get('extractor_key') and info.get('id'):
+        key = archive_id(info['extractor_key'], info['id'])
+
+    # Named after the file yt-dlp wrote, so titles it had to sanitise still match. The MP3 name is
+    # also the storage key, so local files get part of their hash like downloads get their id.
+    stem = os.path.splitext(os.path.basename(downloaded_file))[0]
+    if not downloaded:
+        stem = f"{stem} [{key.split(' ', 1)[1][:12]}]"
+    mp3_file = os.path.join(output_path, stem + ".mp3")
+    if os.path.abspath(downloaded_file) != os.path.abspath(mp3_file):
+        with tracing.stage("transcode", source=source):
+            tracing.submit(transcodes, transcode_to_mp3, downloaded_file, mp3_file).result()
+        if downloaded:
+            os.remove(downloaded_file)
+
+    # Loudness and waveform peaks, so clients don't have to decode the track themselves
+    peaks_file = os.path.splitext(mp3_file)[0] + ".peaks.dat"
+    try:
+        with tracing.stage("analysis", source=source):
+            loudness = tracing.submit(transcodes, analyze_audio, mp3_file, peaks_file).result()
+    except Exception as e:
+        print(f"Failed to analyse {source}: {e}")
+        loudness, peaks_file = None, None
+
+    metadata = {
+        "name": info.get('title') or 'Unknown title',
+        "artist": info.get('artist') or info.get('uploader') or 'Unknown artist',
+        "duration": info.get('duration') or 0,
+        "thumbnail_url": info.get('thumbnail') or 'No thumbnail',
+        "source": source,
+        "loudness": loudness
     }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        for url in urls:
-            try:
-                # Extract metadata
-                info_dict = ydl.extract_info(url, download=False)
-
-                # Download audio
-                ydl.download([url])
-
-                # Extract detail metadata
-                music_name = info_dict.get('title', 'Unknown title')
-                artist = info_dict.get(
-                    'artist', info_dict.get('uploader', 'Unknown artist'))
-                duration = info_dict.get('duration', 0)
-                thumbnail_url = info_dict.get('thumbnail', 'No thumbnail')
-
-                # Define the local file path
-                local_file_path = os.path.join(output_path, f"{music_name}.mp3")
-
-                # Upload the audio to Firebase Storage
-                audio_url = upload_to_firebase(local_file_path, f"audios/{music_name}.mp3")
-
-                # Create the metadata dictionary
-                metadata = {
-                    "audio_url": audio_url,
-                    "name": music_name,
-                    "artist": artist,
-                    "duration": duration,
-                    "thumbnail_url": thumbnail_url,
-                    "source": url
-                }
-                # Append the metadata to the list
-                metadata_list.append(metadata)
-
-            except Exception as e:
-                print(f"An error occurred with {url}: {e}")
-
-    # Save metadata to a JSON file
-    with open(metadata_file, 'w', encoding='utf-8') as json_file:
-        json.dump(metadata_list, json_file, ensure_ascii=False, indent=4)
+    return key, metadata, mp3_file, file_md5(mp3_file).hexdigest(), peaks_file
+
+
+def download_audio(urls, output_path='outputs/audios', metadata_file='outputs/audio_metadata.json', force=False):
+    """Function download audio base on url list; local media files work in place of URLs.
+
+    Sources already in the audio_tracks index are not fetched again unless force is set.
+    """
+    # Traced as one unit, so the background uploads are counted in it too
+    with tracing.trace("audio", urls=len(urls)), create_app(embedded_workers=False).app_context():
+        return run_download_audio(urls, output_path, metadata_file, force=force)
+
+
+def run_download_audio(urls, output_path, metadata_file, download_concurrency=DOWNLOAD_CONCURRENCY,
+                       transcode_workers=TRANSCODE_WORKERS, force=False):
+    """Download, transcode and upload as a pipeline, writing each track to metadata_file once uploaded.
+
+    Needs an app context for the index. Known sources are written straight from the index;
+    up to download_concurrency new items are fetched at once, at most transcode_workers MP3
+    encodes and analyses run at once and uploads overlap the next downloads. Tracks are written in the order they finish.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    keys = {}
+    for url in urls:
+        try:
+            keys.setdefault(url, source_id(url))
+        except Exception as e:
+            print(f"An error occurred with {url}: {e}")
+    known = {} if force else known_tracks(set(keys.values()))
+
+    completed = 0
+    # Transcodes only need threads, ffmpeg is its own process. Reaping it here also keeps its
+    # CPU time and spawn count in this process's trace.
+    with open(metadata_file, 'w', encoding='utf-8') as f, \
+            ThreadPoolExecutor(max_workers=download_concurrency) as downloads, \
+            ThreadPoolExecutor(max_workers=transcode_workers) as transcodes:
+        def write(metadata):
+            # Written as soon as it is final, so an interrupted run keeps what it finished
+            nonlocal completed
+            f.write(",\n" if completed else "\n")
+            f.write(json.dumps(metadata, ensure_ascii=False, indent=4))
+            f.flush()
+            completed += 1
+
+        f.write("[")
+        tracks = {}
+        fetching = set()
+        for url, key in keys.items():
+            if key in known:
+                write(known[key].details)
+            elif key not in fetching:
+                fetching.add(key)
+                tracks[tracing.submit(downloads, prepare_track, url, key, output_path, transcodes)] = url
+        print(f"{len(known)} of {len(keys)} sources are already in the library")
+
+        uploads = {}
+        while tracks or uploads:
+            done, _ = wait(list(tracks) + list(uploads), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in tracks:
+                    url = tracks.pop(future)
+                    try:
+                        key, metadata, mp3_file, file_hash, peaks_file = future.result()
+                    except Exception as e:
+                        print(f"An error occurred with {url}: {e}")
+                        continue
+                    # Upload the audio to Firebase Storage while the next items are downloading
+                    upload = upload_to_firebase(mp3_file, f"audios/{os.path.basename(mp3_file)}")
+                    peaks_upload = (upload_to_firebase(peaks_file, f"audios/{os.path.basename(peaks_file)}")
+                                    if peaks_file else None)
+                    uploads[upload] = (key, metadata, file_hash, peaks_upload)
+                    continue
+
+                key, metadata, file_hash, peaks_upload = uploads.pop(future)
+                try:
+                    metadata = {"audio_url": future.result(), **metadata}
+                except Exception as e:
+                    print(f"Failed to upload {metadata['source']}: {e}")
+                    continue
+                metadata["peaks_url"] = None
+                if peaks_upload is not None:
+                    try:
+                        metadata["peaks_url"] = peaks_upload.result()
+                    except Exception as e:
+                        print(f"Failed to upload the peaks of {metadata['source']}: {e}")
+                save_track(key, metadata, file_hash)
+                write(metadata)
+        f.write("\n]\n")
+
+    print(f"Saved {completed}/{len(urls)} tracks to {metadata_file}")
+    return completed
 
 
 if __name__ == "__main__":
-    youtube_urls = [
+    # URLs or local media files can be passed on the command line
+    youtube_urls = sys.argv[1:] or [
         "https://www.youtube.com/watch?v=YQHsXMglC9A",
         "https://www.youtube.com/watch?v=mHONNcZbwDY",
         "https://www.youtube.com/watch?v=HzjE33U_gy8",
@@ -0,0 +1,74 @@
+import functools
+import os
+
+from application.video.downloader import file_md5
+from models import AudioTrack
+from models.user import db
+
+LOOKUP_BATCH = 500  # source ids per IN query
+
+
+def is_local(source):
+    return source.startswith('file://') or os.path.isfile(source)
+
+
+def local_path(source):
+    return source[len('file://'):] if source.startswith('file://') else source
+
+
+@functools.lru_cache(maxsize=1)
+def extractor_classes():
+    import yt_dlp
+    return list(yt_dlp.extractor.gen_extractor_classes())
+
+
+def archive_id(extractor_key, video_id):
+    # Same form as yt-dlp's --download-archive entries
+    return f"{extractor_key.lower()} {video_id}"
+
+
+def source_id(source):
+    """Index key of a source without fetching it.
+
+    URLs are keyed by the extractor's video id, parsed from the URL alone. Local media files
+    are keyed by their content hash, so an edited file counts as a new item.
+    """
+    if is_local(source):
+        return f"file {file_md5(local_path(source)).hexdigest()}"
+    for extractor in extractor_classes():
+        if extractor.suitable(source):
+            video_id = extractor.get_temp_id(source)
+            if video_id:
+                return archive_id(extractor.ie_key(), video_id)
+            break
+    return f"url {source}"
+
+
+def known_tracks(source_ids):
+    """Indexed tracks by source id, for the ids given."""
+    source_ids = list(source_ids)
+    tracks = {}
+    for start in range(0, len(source_ids), LOOKUP_BATCH):
+        batch = source_ids[start:start + LOOKUP_BATCH]
+        tracks.update((track.source_id, track) for track in AudioTrack.query.filter(AudioTrack.source_id.in_(batch)))
+    return tracks
+
+
+def save_track(source_id, metadata, file_hash=None):
+    """Insert or update the index entry of a track from its metadata record."""
+    track = AudioTrack.query.filter_by(source_id=source_id).first() or AudioTrack(source_id=source_id)
+    track.source = metadata["source"]
+    track.file_hash = file_hash
+    track.audio_url = metadata["audio_url"]
+    track.name = metadata["name"]
+    track.artist = metadata["artist"]
+    track.duration = metadata["duration"]
+    track.thumbnail_url = metadata["thumbnail_url"]
+    track.details = metadata
+    db.session.add(track)
+    db.session.commit()
+    return track
+
+
+def track_to_dict(track):
+    return {"id": track.id, "source_id": track.source_id, **track.details}
@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask_jwt_extended import get_jwt, get_jwt_identity
+
+from config import Config
+from models.user import db, User
+
+PROFILE_CLAIMS = ("uid", "email", "name")
+
+_cache = OrderedDict()  # user_name -> (expires_at, record)
+_cache_lock = threading.Lock()
+
+
+def user_record(user):
+    """The cached form of a user: its profile without the password hash."""
+    return {"id": user.id, "user_name": user.user_name, "email": user.email, "name": user.name}
+
+
+def profile_claims(user):
+    """Additional access token claims when JWT_PROFILE_CLAIMS is on, else None."""
+    if not Config.JWT_PROFILE_CLAIMS:
+        return None
+    return {"uid": user.id, "email": user.email, "name": user.name}
+
+
+def cached_record(user_name):
+    with _cache_lock:
+        entry = _cache.get(user_name)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _cache[user_name]
+            return None
+        _cache.move_to_end(user_name)
+        return entry[1]
+
+
+def cache_record(record):
+    with _cache_lock:
+        _cache[record["user_name"]] = (time.monotonic() + Config.IDENTITY_CACHE_TTL, record)
+        _cache.move_to_end(record["user_name"])
+        while len(_cache) > Config.IDENTITY_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate(user_name):
+    """Drop a user from this process's cache; other processes see the change once their entry expires."""
+    with _cache_lock:
+        _cache.pop(user_name, None)
+
+
+def load_record(user_name):
+    """A user's record from the cache, or from the database without loading the password hash."""
+    record = cached_record(user_name)
+    if record is not None:
+        return record
+    row = (db.session.query(User.id, User.user_name, User.email, User.name)
+           .filter_by(user_name=user_name).first())
+    if row is None:
+        return None  # Not cached, so a user registered afterwards is found right away
+    record = user_record(row)
+    cache_record(record)
+    return record
+
+
+def current_identity():
+    """The record of the user behind the request's access token, or None.
+
+    Tokens carrying profile claims are answered from the token alone.
+    """
+    user_name = get_jwt_identity()
+    claims = get_jwt()
+    if Config.JWT_PROFILE_CLAIMS and all(claim in claims for claim in PROFILE_CLAIMS):
+        return {"id": claims["uid"], "user_name": user_name, "email": claims["email"], "name": claims["name"]}
+    return load_record(user_name)
@@ -1,13 +1,20 @@
-from flask import Blueprint, request
+import json
+
+from flask import Blueprint, Response, request, stream_with_context
 from flask_jwt_extended import create_access_token, create_refresh_token
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from application.auth.identity import current_identity, invalidate, profile_claims
 from application.response import create_response
 from models.user import db, User
 
 user = Blueprint('user', __name__)
 
+USERS_PAGE_SIZE = 100
+MAX_USERS_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 1000  # Rows fetched per round trip while streaming
+
 
 @user.route('/register', methods=['POST'])
 def register():
@@ -43,7 +50,8 @@ def login():
         return create_response(message="Invalid credentials", code=400)
 
     #     Create access token
-    access_token = create_access_token(identity=current_user.user_name)
+    access_token = create_access_token(identity=current_user.user_name,
+                                       additional_claims=profile_claims(current_user))
     refresh_token = create_refresh_token(identity=current_user.user_name)
     return create_response(message="Login successfully", code=200, data={
         "access_token": access_token,
@@ -51,32 +59,62 @@ def login():
     })
 
 
-# Route get all users
+def user_list_query(after=None, user_name=None, email=None):
+    """Users after the id cursor, optionally filtered by prefix, without loading password hashes."""
+    query = db.session.query(User.id, User.user_name, User.email).order_by(User.id)
+    if after is not None:
+        query = query.filter(User.id > after)
+    if user_name:
+        query = query.filter(User.user_name.startswith(user_name, autoescape=True))
+    if email:
+        query = query.filter(User.email.startswith(email, autoescape=True))
+    return query
+
+
+def stream_users(query):
+    """The get_all response as a JSON stream, so large lists are never held in memory at once."""
+    yield '{"message": "Fetch list successfully", "code": 200, "data": ['
+    for index, row in enumerate(query.yield_per(STREAM_BATCH_SIZE)):
+        yield ("," if index else "") + json.dumps({"id": row.id, "username": row.user_name, "email": row.email})
+    yield ']}'
+
+
+# Route get all users, one page at a time: pass meta.next_after as after to get the next page
 @user.route('/get_all', methods=['GET'])
 @jwt_required()
 def get_users():
-    users = User.query.all()
-    return create_response(message="Fetch list successfully", code=200,
-                           data=[{"id": user.id, "username": user.user_name, "email": user.email} for user in users])
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', USERS_PAGE_SIZE, type=int)
+    query = user_list_query(after, request.args.get('user_name'), request.args.get('email'))
+
+    # Everything after the cursor, streamed instead of paginated
+    if request.args.get('stream') in ('1', 'true'):
+        return Response(stream_with_context(stream_users(query)), mimetype='application/json')
+
+    limit = min(max(limit, 1), MAX_USERS_PAGE_SIZE)
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    users = [{"id": row.id, "username": row.user_name, "email": row.email} for row in rows[:limit]]
+    next_after = users[-1]["id"] if len(rows) > limit else None
+    return create_response(message="Fetch list successfully", code=200, data=users,
+                           meta={"limit": limit, "next_after": next_after})
 
 
 # Get user info
 @user.route('/info', methods=['GET'])
 @jwt_required()
 def get_user_info():
-    # Get the identity of the current user from the token
-    current_user_name = get_jwt_identity()
-    # Fetch user details from the database
-    current_user = User.query.filter_by(user_name=current_user_name).first()
+    # Resolve the user from the token claims or the identity cache, falling back to the database
+    current_user = current_identity()
 
     # Validate
     if not current_user:
         return create_response(message="No user found", code=400)
 
     user_info = {
-        "user_name": current_user.user_name,
-        "email": current_user.email,
-        "name": current_user.name
+        "user_name": current_user["user_name"],
+        "email": current_user["email"],
+        "name": current_user["name"]
     }
 
     return create_response(message="Get user info successfully", code=200, data=user_info)
@@ -105,6 +143,13 @@ def update_user_info():
 
     try:
         db.session.commit()
+        invalidate(current_user_name)
+        # Profile claims in the old token are stale now, so hand out a fresh one
+        claims = profile_claims(current_user)
+        if claims:
+            access_token = create_access_token(identity=current_user_name, additional_claims=claims)
+            return create_response(message="Update user info successfully", code=200,
+                                   data={"access_token": access_token})
         return create_response(message="Update user info successfully", code=200)
     except Exception as e:
         db.session.rollback()
@@ -1,18 +1,23 @@
+import os
+
 from dotenv import load_dotenv
-from flask import Flask
+from flask import Flask, Response
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
 
+from application.audio.audio import audio
 from application.auth.user import db
 from application.auth.user import user
 from application.response import create_response
+from application.tracing import MetricsSummary
+from application.video.video import video
 from config import Config
 
 # Load environment variables from a .env file
 load_dotenv()
 
 
-def create_app():
+def create_app(embedded_workers=True):
     app = Flask(__name__)
     # Load configuration
     app.config.from_object(Config)
@@ -26,6 +31,22 @@ def create_app():
 
     # Register Blueprint
     app.register_blueprint(user, url_prefix='/user')
+    app.register_blueprint(video, url_prefix='/video')
+    app.register_blueprint(audio, url_prefix='/audio')
+
+    # Optional worker threads for the video job queue; the debug reloader's watcher process runs none
+    reloader_watcher = app.debug and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    if embedded_workers and Config.VIDEO_EMBEDDED_WORKERS and not reloader_watcher:
+        from application.video.worker import start_embedded_workers
+        start_embedded_workers(app, Config.VIDEO_EMBEDDED_WORKERS)
+
+    if Config.ENABLE_METRICS_ENDPOINT:
+        metrics_summary = MetricsSummary()
+
+        # Left unauthenticated for Prometheus scrapers; keep it on an internal network
+        @app.route('/metrics', methods=['GET'])
+        def metrics():
+            return Response(metrics_summary.render(), mimetype='text/plain; version=0.0.4')
 
     @jwt.unauthorized_loader
     def custom_unauthorized_response(error):
@@ -1,13 +1,14 @@
 from flask import jsonify
 
 
-def create_response(message, code=200, data=None):
+def create_response(message, code=200, data=None, meta=None):
     """
    Create a standardized JSON response.
 
    :param message: Response message (str)
    :param code: HTTP status code (default is 200)
    :param data: Data to be returned in the response (list, dict, or None)
+   :param meta: Optional extra information about the data, such as pagination (dict or None)
    :return: JSON response
    """
 
@@ -21,4 +22,7 @@ def create_response(message, code=200, data=None):
     else:
         response["data"] = [] if isinstance(data, list) else {}
 
+    if meta is not None:
+        response["meta"] = meta
+
     return jsonify(response), code
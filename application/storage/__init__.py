@@ -0,0 +1,36 @@
+import threading
+
+from application.storage.base import Storage, file_hashes, hashes_match
+from application.storage.firebase import FirebaseStorage
+from application.storage.local import LocalStorage
+from application.storage.memory import MemoryStorage
+from config import Config
+
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def create_storage(backend=None, **options):
+    """Create a storage backend, taking any option not given from Config."""
+    backend = backend or Config.STORAGE_BACKEND
+    if backend == 'firebase':
+        return FirebaseStorage(options.get('bucket_name', Config.FIREBASE_STORAGE_BUCKET_NAME),
+                               options.get('credentials_path', Config.FIREBASE_CREDENTIALS_PATH))
+    if backend == 'local':
+        return LocalStorage(options.get('root', Config.LOCAL_STORAGE_DIR),
+                            options.get('base_url', Config.LOCAL_STORAGE_URL))
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def get_storage(backend=None, **options):
+    """Return the process-wide storage for a backend, creating it on first use."""
+    key = (backend or Config.STORAGE_BACKEND, tuple(sorted(options.items())))
+    with _storages_lock:
+        if key not in _storages:
+            _storages[key] = create_storage(backend, **options)
+        return _storages[key]
+
+
+__all__ = ['Storage', 'file_hashes', 'hashes_match', 'FirebaseStorage', 'LocalStorage', 'MemoryStorage', 'create_storage', 'get_storage']
@@ -0,0 +1,84 @@
+import base64
+import hashlib
+from urllib.parse import unquote
+
+try:
+    import google_crc32c
+except ImportError:  # Installed with google-cloud-storage; without it only MD5 is compared
+    google_crc32c = None
+
+
+def file_hashes(local_file_path, chunk_size=1024 * 1024):
+    """MD5 (and CRC32C when available) of a local file, base64 encoded like GCS reports them."""
+    md5 = hashlib.md5()
+    crc32c = google_crc32c.Checksum() if google_crc32c else None
+    with open(local_file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+            if crc32c:
+                crc32c.update(chunk)
+    hashes = {'md5': base64.b64encode(md5.digest()).decode()}
+    if crc32c:
+        hashes['crc32c'] = base64.b64encode(crc32c.digest()).decode()
+    return hashes
+
+
+def hashes_match(local, remote):
+    """True when at least one hash is known on both sides and all shared hashes agree."""
+    shared = [name for name in local if remote.get(name)]
+    return bool(shared) and all(local[name] == remote[name] for name in shared)
+
+
+class Storage:
+    """Common interface of every storage backend.
+
+    Backends implement put, exists and public_url; put_many and exists_many fall back
+    to one call per file and can be overridden where the backend can batch.
+    """
+
+    def put(self, local_file_path, remote_path):
+        """Store a local file under remote_path and return its public URL."""
+        raise NotImplementedError
+
+    def put_many(self, files):
+        """Store (local_file_path, remote_path) pairs and return their public URLs in order."""
+        return [self.put(local_file_path, remote_path) for local_file_path, remote_path in files]
+
+    def exists(self, remote_path):
+        raise NotImplementedError
+
+    def exists_many(self, remote_paths):
+        return [self.exists(remote_path) for remote_path in remote_paths]
+
+    def public_url(self, remote_path):
+        raise NotImplementedError
+
+    def hashes(self, remote_path):
+        """Return {'md5': ..., 'crc32c': ...} (base64) for a stored object, or None if it does not exist."""
+        raise NotImplementedError
+
+    def copy(self, source_path, target_path):
+        """Copy an object inside the storage without transferring it through this machine."""
+        raise NotImplementedError
+
+    def put_deduplicated(self, local_file_path, remote_path):
+        """Like put, but skip the transfer when remote_path already holds the same content."""
+        remote = self.hashes(remote_path)
+        if remote and hashes_match(file_hashes(local_file_path), remote):
+            return self.public_url(remote_path)
+        return self.put(local_file_path, remote_path)
+
+    def copy_deduplicated(self, source_path, target_path):
+        if source_path != target_path:
+            source = self.hashes(source_path)
+            target = self.hashes(target_path)
+            if not (source and target and hashes_match(source, target)):
+                return self.copy(source_path, target_path)
+        return self.public_url(target_path)
+
+    def path_from_url(self, url):
+        """Return the remote path of a URL that points into this storage, or None."""
+        prefix = self.public_url("")
+        if url.startswith(prefix) and len(url) > len(prefix):
+            return unquote(url[len(prefix):].split('?')[0])
+        return None
@@ -0,0 +1,76 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+from application.storage.base import Storage
+
+
+class FirebaseStorage(Storage):
+    """Firebase Storage backend.
+
+    The Firebase app and bucket handle are created on first use and shared by every call,
+    so importing a module that uses storage no longer needs credentials or network.
+    """
+
+    def __init__(self, bucket_name, credentials_path, max_workers=8):
+        self.bucket_name = bucket_name
+        self.credentials_path = credentials_path
+        self.max_workers = max_workers
+        self._bucket = None
+        self._lock = threading.Lock()
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            with self._lock:
+                if self._bucket is None:
+                    import firebase_admin
+                    from firebase_admin import credentials, storage
+
+                    try:
+                        app = firebase_admin.get_app()
+                    except ValueError:
+                        app = firebase_admin.initialize_app(credentials.Certificate(self.credentials_path), {
+                            'storageBucket': self.bucket_name
+                        })
+                    self._bucket = storage.bucket(self.bucket_name, app=app)
+        return self._bucket
+
+    def put(self, local_file_path, remote_path):
+        blob = self.bucket.blob(remote_path)
+        # Setting the ACL with the upload saves the separate make_public() round trip
+        blob.upload_from_filename(local_file_path, predefined_acl='publicRead')
+        return self.public_url(remote_path)
+
+    def put_many(self, files):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda item: self.put(*item), files))
+
+    def exists(self, remote_path):
+        return self.bucket.blob(remote_path).exists()
+
+    def hashes(self, remote_path):
+        blob = self.bucket.get_blob(remote_path)
+        if blob is None:
+            return None
+        return {'md5': blob.md5_hash, 'crc32c': blob.crc32c}
+
+    def copy(self, source_path, target_path):
+        # Server-side copy: the object's bytes never leave Google's network
+        blob = self.bucket.copy_blob(self.bucket.blob(source_path), self.bucket, target_path)
+        blob.make_public()
+        return self.public_url(target_path)
+
+    def exists_many(self, remote_paths):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.exists, remote_paths))
+
+    def public_url(self, remote_path):
+        return f"https://storage.googleapis.com/{self.bucket_name}/{quote(remote_path, safe='/~')}"
+
+    def path_from_url(self, url):
+        # Download URLs from the Firebase console look like .../v0/b/<bucket>/o/<quoted path>?alt=media
+        prefix = f"https://firebasestorage.googleapis.com/v0/b/{self.bucket_name}/o/"
+        if url.startswith(prefix):
+            return unquote(url[len(prefix):].split('?')[0])
+        return super().path_from_url(url)
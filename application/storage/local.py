@@ -0,0 +1,55 @@
+import functools
+import os
+import shutil
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from application.storage.base import Storage, file_hashes
+
+
+class LocalStorage(Storage):
+    """Stores objects under a local directory, served over HTTP by serve()."""
+
+    def __init__(self, root, base_url=None):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip('/') if base_url else None
+
+    def path(self, remote_path):
+        return os.path.join(self.root, remote_path)
+
+    def put(self, local_file_path, remote_path):
+        target = self.path(remote_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_file_path, target)
+        return self.public_url(remote_path)
+
+    def exists(self, remote_path):
+        return os.path.exists(self.path(remote_path))
+
+    def hashes(self, remote_path):
+        return file_hashes(self.path(remote_path)) if self.exists(remote_path) else None
+
+    def copy(self, source_path, target_path):
+        target = self.path(target_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(self.path(source_path), target)
+        return self.public_url(target_path)
+
+    def public_url(self, remote_path):
+        if self.base_url:
+            return f"{self.base_url}/{remote_path}"
+        return f"file://{self.path(remote_path)}"
+
+
+def serve(root, host='localhost', port=8001):
+    """Serve a LocalStorage directory as static files."""
+    os.makedirs(root, exist_ok=True)
+    handler = functools.partial(SimpleHTTPRequestHandler, directory=root)
+    httpd = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {root} at http://{host}:{port}")
+    httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    from config import Config
+
+    serve(Config.LOCAL_STORAGE_DIR, port=Config.LOCAL_STORAGE_PORT)
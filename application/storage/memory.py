@@ -0,0 +1,38 @@
+import base64
+import hashlib
+import threading
+
+from application.storage.base import Storage
+
+
+class MemoryStorage(Storage):
+    """Keeps objects in a dict, for tests and for measuring pipeline cost without any I/O."""
+
+    def __init__(self, base_url="memory://"):
+        self.base_url = base_url
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def put(self, local_file_path, remote_path):
+        with open(local_file_path, 'rb') as f:
+            data = f.read()
+        with self.lock:
+            self.objects[remote_path] = data
+        return self.public_url(remote_path)
+
+    def exists(self, remote_path):
+        return remote_path in self.objects
+
+    def hashes(self, remote_path):
+        data = self.objects.get(remote_path)
+        if data is None:
+            return None
+        return {'md5': base64.b64encode(hashlib.md5(data).digest()).decode()}
+
+    def copy(self, source_path, target_path):
+        with self.lock:
+            self.objects[target_path] = self.objects[source_path]
+        return self.public_url(target_path)
+
+    def public_url(self, remote_path):
+        return f"{self.base_url}{remote_path}"
@@ -0,0 +1,264 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+METRICS_FILE = os.getenv('METRICS_FILE', os.path.join(PROJECT_DIR, "outputs/metrics.jsonl"))
+ENABLE_TRACING = os.getenv('ENABLE_TRACING', '1') != '0'
+
+_current_trace = ContextVar('current_trace', default=None)
+_open_stages = ContextVar('open_stages', default=())
+_write_lock = threading.Lock()
+
+# Record fields summed up by MetricsSummary
+COUNTER_SUFFIXES = ("_seconds", "_bytes", "_chars", "_spawns", "_count", "_retries")
+
+
+def read_proc_io():
+    """Bytes read and written by this process and its reaped children (so ffmpeg runs included):
+    storage I/O as read_bytes/write_bytes, and all I/O including sockets as rchar/wchar."""
+    try:
+        with open('/proc/self/io') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f)}
+    except OSError:
+        return {}
+
+
+def snapshot():
+    """Process-wide resource counters; stages are measured as the difference of two snapshots.
+
+    ffmpeg and ffprobe are child processes, so their CPU time shows up in RUSAGE_CHILDREN
+    and their I/O in /proc/self/io once they have exited. Counters are per process, so work
+    running in other threads at the same time (background uploads, embedded workers) is
+    included.
+    """
+    io = read_proc_io()
+    data = {
+        "wall_seconds": time.perf_counter(),
+        "cpu_seconds": time.process_time(),
+        "read_bytes": io.get('read_bytes', 0),
+        "write_bytes": io.get('write_bytes', 0),
+        "read_chars": io.get('rchar', 0),
+        "write_chars": io.get('wchar', 0),
+        "child_cpu_seconds": 0.0
+    }
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        data["child_cpu_seconds"] = children.ru_utime + children.ru_stime
+    return data
+
+
+def peak_rss():
+    """High-water marks in kilobytes of this process and of its largest child so far."""
+    if resource is None:
+        return {"peak_rss_kb": 0, "child_peak_rss_kb": 0}
+    return {
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "child_peak_rss_kb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    }
+
+
+def measure(start):
+    end = snapshot()
+    data = {key: round(end[key] - start[key], 6) for key in start}
+    data.update(peak_rss())
+    return data
+
+
+def write_record(record, metrics_file=None):
+    line = json.dumps(record, default=str) + "\n"
+    metrics_file = metrics_file or METRICS_FILE
+    try:
+        os.makedirs(os.path.dirname(metrics_file), exist_ok=True)
+        # One write per line in append mode, so lines from several worker processes don't interleave
+        with _write_lock, open(metrics_file, 'a') as f:
+            f.write(line)
+    except OSError as e:
+        logging.warning(f"Could not write metrics to {metrics_file}: {e}")
+
+
+class Trace:
+    """Resource usage of one unit of work (a video, an audio batch), split into stages."""
+
+    def __init__(self, name, **labels):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.labels = labels
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.start = None
+
+    def count(self, counter, amount=1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def record(self, status="ok"):
+        record = {
+            "type": "trace",
+            "trace_id": self.id,
+            "name": self.name,
+            "status": status,
+            "timestamp": datetime.utcnow().isoformat(),
+            **self.labels,
+            **measure(self.start)
+        }
+        with self.lock:
+            record.update(self.counters)
+        return record
+
+
+class Stage:
+    def __init__(self, name):
+        self.name = name
+        self.counters = Counter()
+
+
+@contextmanager
+def trace(name, **labels):
+    """Trace a unit of work: stages run inside it are tagged with its id, and a summary
+    line with the totals and ffmpeg/ffprobe spawn counts is written when it ends."""
+    if not ENABLE_TRACING:
+        yield None
+        return
+
+    current = Trace(name, **labels)
+    current.start = snapshot()
+    token = _current_trace.set(current)
+    status = "ok"
+    try:
+        yield current
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _current_trace.reset(token)
+        write_record(current.record(status))
+
+
+@contextmanager
+def stage(name, **labels):
+    """Measure one stage and write it as a JSON line to METRICS_FILE."""
+    if not ENABLE_TRACING:
+        yield
+        return
+
+    current = Stage(name)
+    start = snapshot()
+    token = _open_stages.set(_open_stages.get() + (current,))
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        _open_stages.reset(token)
+        parent = _current_trace.get()
+        record = {
+            "type": "stage",
+            "trace_id": parent.id if parent else None,
+            "trace": parent.name if parent else None,
+            "stage": name,
+            "status": status,
+            "timestamp": datetime.utcnow().isoformat(),
+            **(parent.labels if parent else {}),
+            **labels,
+            **measure(start),
+            **current.counters
+        }
+        write_record(record)
+
+
+def count(counter, amount=1):
+    """Add to a counter (e.g. "ffmpeg_spawns") of the current trace and of every open stage."""
+    parent = _current_trace.get()
+    if parent is not None:
+        parent.count(counter, amount)
+    for open_stage in _open_stages.get():
+        open_stage.counters[counter] += amount
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that keeps the current trace, so work in the pool is attributed to it."""
+    return executor.submit(copy_context().run, fn, *args, **kwargs)
+
+
+class MetricsSummary:
+    """Prometheus text rendering of METRICS_FILE.
+
+    Worker processes write their own lines, so the file is the one place that sees all of
+    them. Only lines appended since the previous scrape are read.
+    """
+
+    def __init__(self, metrics_file=None):
+        self.metrics_file = metrics_file or METRICS_FILE
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.stages = defaultdict(Counter)
+        self.traces = defaultdict(Counter)
+        self.peak_rss_kb = 0
+        self.child_peak_rss_kb = 0
+
+    def refresh(self):
+        try:
+            size = os.path.getsize(self.metrics_file)
+        except OSError:
+            return
+        if size < self.offset:
+            self.reset()  # The file was rotated or truncated
+        with open(self.metrics_file, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        self.offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                self.add(json.loads(line))
+            except ValueError:
+                continue
+
+    def add(self, record):
+        self.peak_rss_kb = max(self.peak_rss_kb, record.get("peak_rss_kb", 0))
+        self.child_peak_rss_kb = max(self.child_peak_rss_kb, record.get("child_peak_rss_kb", 0))
+        if record.get("type") == "stage":
+            totals = self.stages[(record["stage"], record["status"])]
+        else:
+            totals = self.traces[(record["name"], record["status"])]
+        totals["count"] += 1
+        for key, value in record.items():
+            if key.endswith(COUNTER_SUFFIXES) and isinstance(value, (int, float)):
+                totals[key] += value
+
+    def render(self):
+        with self.lock:
+            self.refresh()
+            lines = []
+            for prefix, label, groups in (("video_stage", "stage", self.stages), ("video_trace", "name", self.traces)):
+                metrics = defaultdict(list)
+                for (name, status), totals in sorted(groups.items()):
+                    for key, value in sorted(totals.items()):
+                        metric = f"{prefix}_runs_total" if key == "count" else f"{prefix}_{key}_total"
+                        metrics[metric].append(f'{metric}{{{label}="{name}",status="{status}"}} {value}')
+                for metric, samples in metrics.items():
+                    lines.append(f"# TYPE {metric} counter")
+                    lines.extend(samples)
+            lines.append("# TYPE video_peak_rss_bytes gauge")
+            lines.append(f"video_peak_rss_bytes {self.peak_rss_kb * 1024}")
+            lines.append("# TYPE video_child_peak_rss_bytes gauge")
+            lines.append(f"video_child_peak_rss_bytes {self.child_peak_rss_kb * 1024}")
+            return "\n".join(lines) + "\n"
@@ -0,0 +1,81 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from application import tracing
+from application.storage import get_storage
+
+
+class Uploader:
+    """Uploads files through a thread pool, retrying failed uploads with exponential backoff.
+
+    submit() returns immediately with a Future, so callers can keep producing files
+    (e.g. ffmpeg extracting thumbnails) while earlier ones are being uploaded.
+    """
+
+    def __init__(self, storage, max_workers=8, retries=3, backoff=0.5):
+        self.storage = storage
+        self.retries = retries
+        self.backoff = backoff
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="uploader")
+
+    def upload_with_retry(self, local_file_path, remote_path, deduplicate=False):
+        put = self.storage.put_deduplicated if deduplicate else self.storage.put
+        attempt = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                url = put(local_file_path, remote_path)
+                # Added to the trace of the caller that submitted the upload
+                tracing.count("upload_count")
+                tracing.count("upload_bytes", os.path.getsize(local_file_path))
+                tracing.count("upload_seconds", time.perf_counter() - start)
+                return url
+            except Exception as e:
+                if attempt >= self.retries:
+                    raise
+                tracing.count("upload_retries")
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logging.warning(f"Upload of {remote_path} failed ({e}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                attempt += 1
+
+    def submit(self, local_file_path, remote_path, deduplicate=False):
+        """Queue an upload; with deduplicate, identical content already at remote_path is not sent again."""
+        return tracing.submit(self.executor, self.upload_with_retry, local_file_path, remote_path, deduplicate)
+
+    def upload(self, local_file_path, remote_path):
+        return self.submit(local_file_path, remote_path).result()
+
+    def upload_many(self, files):
+        """Upload (local_file_path, remote_path) pairs concurrently and return their URLs in order."""
+        futures = [self.submit(local_file_path, remote_path) for local_file_path, remote_path in files]
+        return [future.result() for future in futures]
+
+    def public_url(self, remote_path):
+        return self.storage.public_url(remote_path)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+_uploaders = {}
+_uploaders_lock = threading.Lock()
+
+
+def get_uploader(backend=None, max_workers=8, **options):
+    """Return the process-wide uploader for a storage backend, creating it on first use."""
+    storage = get_storage(backend, **options)
+    with _uploaders_lock:
+        if id(storage) not in _uploaders:
+            _uploaders[id(storage)] = Uploader(storage, max_workers=max_workers)
+        return _uploaders[id(storage)]
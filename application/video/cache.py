@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+import requests
+
+from application.video.downloader import DownloadError, get_session
+
+
+def params_hash(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """Content hash of a local file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remote_fingerprint(url, timeout=10):
+    """Identify a remote source by content hash, ETag or Last-Modified plus size without downloading it.
+
+    Returns None when the server gives neither, in which case the caller has to fall
+    back to hashing the downloaded content.
+    """
+    try:
+        # The shared session refuses redirects to non-public addresses
+        response = get_session().head(url, allow_redirects=True, timeout=timeout)
+        response.raise_for_status()
+    except (requests.RequestException, DownloadError) as e:
+        logging.warning(f"Could not fingerprint {url}: {e}")
+        return None
+
+    # A content hash from the server (GCS sends x-goog-hash) identifies the bytes at any URL
+    for part in response.headers.get('x-goog-hash', '').split(','):
+        if part.strip().startswith('md5='):
+            return f"md5:{part.strip()[4:]}"
+    if response.headers.get('Content-MD5'):
+        return f"md5:{response.headers['Content-MD5']}"
+
+    size = response.headers.get('Content-Length')
+    etag = response.headers.get('ETag')
+    if etag:
+        return f"etag:{url}:{etag}:{size}"
+    last_modified = response.headers.get('Last-Modified')
+    if last_modified and size:
+        return f"modified:{url}:{last_modified}:{size}"
+    return None
+
+
+class ProcessingCache:
+    """Persistent cache of processing results keyed by source fingerprint.
+
+    Every artifact of a video (thumbnails, previews, ...) is stored separately together
+    with a hash of the parameters that produced it, so a change in one setting only
+    invalidates the artifacts that depend on it. Downloaded sources are kept as
+    intermediates and evicted least-recently-used once they exceed max_bytes, except
+    while a job has them pinned.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.sources_dir = os.path.join(root, "sources")
+        os.makedirs(self.sources_dir, exist_ok=True)
+        self.index_file = os.path.join(root, "index.sqlite3")
+        with self.connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS artifacts ("
+                               "source TEXT, name TEXT, params TEXT, value TEXT, updated_at REAL, "
+                               "PRIMARY KEY (source, name))")
+            connection.execute("CREATE TABLE IF NOT EXISTS intermediates ("
+                               "source TEXT PRIMARY KEY, path TEXT, size INTEGER, last_used REAL)")
+            # One row per job using a source; the pid lets eviction ignore pins of workers that died
+            connection.execute("CREATE TABLE IF NOT EXISTS pins (token TEXT PRIMARY KEY, source TEXT, pid INTEGER)")
+
+    @contextmanager
+    def connect(self):
+        # One connection per call keeps the cache safe to use from forked worker processes
+        connection = sqlite3.connect(self.index_file, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def fingerprint(self, url):
+        if os.path.exists(url):
+            return file_fingerprint(url)
+        return remote_fingerprint(url)
+
+    def load(self, source, params):
+        """Return {name: value} for every stored artifact whose parameters still match."""
+        with self.connect() as connection:
+            rows = connection.execute("SELECT name, params, value FROM artifacts WHERE source = ?",
+                                      (source,)).fetchall()
+        return {
+            name: json.loads(value)
+            for name, stored_params, value in rows
+            if name in params and stored_params == params_hash(params[name])
+        }
+
+    def save(self, source, name, params, value):
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?)",
+                               (source, name, params_hash(params), json.dumps(value), time.time()))
+
+    def source_path(self, source):
+        return os.path.join(self.sources_dir, hashlib.sha256(source.encode()).hexdigest())
+
+    @contextmanager
+    def pinned(self, source):
+        """Keep the cached copy of a source from being evicted while the block runs."""
+        token = uuid.uuid4().hex
+        with self.connect() as connection:
+            connection.execute("INSERT INTO pins VALUES (?, ?, ?)", (token, source, os.getpid()))
+        try:
+            yield
+        finally:
+            with self.connect() as connection:
+                connection.execute("DELETE FROM pins WHERE token = ?", (token,))
+
+    def get_intermediate(self, source):
+        """Return the cached local copy of a source, marking it as recently used."""
+        with self.connect() as connection:
+            row = connection.execute("SELECT path FROM intermediates WHERE source = ?", (source,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(row[0]):
+                connection.execute("DELETE FROM intermediates WHERE source = ?", (source,))
+                return None
+            connection.execute("UPDATE intermediates SET last_used = ? WHERE source = ?", (time.time(), source))
+        return row[0]
+
+    def put_intermediate(self, source, local_file_path):
+        """Move a downloaded source into the cache and evict old ones over the size bound."""
+        path = self.source_path(source) + os.path.splitext(local_file_path)[1]
+        if os.path.abspath(local_file_path) != os.path.abspath(path):
+            os.replace(local_file_path, path)
+        with self.connect() as connection:
+            connection.execute("INSERT OR REPLACE INTO intermediates VALUES (?, ?, ?, ?)",
+                               (source, path, os.path.getsize(path), time.time()))
+        self.evict()
+        return path
+
+    def evict(self):
+        with self.connect() as connection:
+            # Taken before reading the pins, so a job can't pin a source while it is being removed
+            connection.execute("BEGIN IMMEDIATE")
+            pinned = set()
+            for token, source, pid in connection.execute("SELECT token, source, pid FROM pins").fetchall():
+                if pid_alive(pid):
+                    pinned.add(source)
+                else:
+                    connection.execute("DELETE FROM pins WHERE token = ?", (token,))
+            rows = connection.execute("SELECT source, path, size FROM intermediates "
+                                      "ORDER BY last_used DESC").fetchall()
+            total = 0
+            for source, path, size in rows:
+                total += size
+                if total <= self.max_bytes or source in pinned:
+                    continue
+                logging.info(f"Evicting cached source {path}")
+                if os.path.exists(path):
+                    os.remove(path)
+                connection.execute("DELETE FROM intermediates WHERE source = ?", (source,))
@@ -0,0 +1,187 @@
+import functools
+import os
+import subprocess
+
+from application.video.ffmpeg_runner import input_args
+
+# Trades CPU per video against output quality for every ffmpeg run; override with the PERFORMANCE_PROFILE env var
+PERFORMANCE_PROFILE = os.getenv('PERFORMANCE_PROFILE', 'balanced')
+
+PROFILES = {
+    "fast": {
+        "threads": 2,  # Decoder threads per ffmpeg run, 0 lets ffmpeg pick one per core
+        "filter_threads": 1,
+        "lowres": 1,  # Decode at half size where the decoder supports it (MJPEG, MPEG-4 part 2, ...)
+        "skip_loop_filter": True,  # Skip H.264/HEVC deblocking for frames that are only scaled down
+        "scaler": "fast_bilinear",
+        "image_format": "jpg",
+        "jpeg_quality": 6,  # -q:v, 2 (best) to 31
+        "webp_quality": 60,  # 0 to 100
+        "avif_quality": 40,  # CRF, 0 (best) to 63
+        "x264_preset": "superfast"
+    },
+    "balanced": {
+        "threads": 0,
+        "filter_threads": 0,
+        "lowres": 0,
+        "skip_loop_filter": False,
+        "scaler": "bicubic",
+        "image_format": "jpg",
+        "jpeg_quality": 4,
+        "webp_quality": 75,
+        "avif_quality": 32,
+        "x264_preset": "veryfast"
+    },
+    "quality": {
+        "threads": 0,
+        "filter_threads": 0,
+        "lowres": 0,
+        "skip_loop_filter": False,
+        "scaler": "lanczos",
+        "image_format": "jpg",
+        "jpeg_quality": 2,
+        "webp_quality": 90,
+        "avif_quality": 24,
+        "x264_preset": "medium"
+    }
+}
+
+
+# Encoders in order of preference, and the quality option with its best and worst values
+IMAGE_FORMATS = {
+    "jpg": {"encoders": ["mjpeg"], "quality_option": "-q:v", "best": 2, "worst": 31},
+    "webp": {"encoders": ["libwebp"], "quality_option": "-quality", "best": 100, "worst": 0},
+    "avif": {"encoders": ["libaom-av1", "libsvtav1"], "quality_option": "-crf", "best": 0, "worst": 63}
+}
+IMAGE_FORMAT_FALLBACKS = {"avif": ["avif", "webp", "jpg"], "webp": ["webp", "jpg"], "jpg": ["jpg"]}
+ENCODER_OPTIONS = {
+    "libwebp": ['-compression_level', '4'],
+    "libaom-av1": ['-cpu-used', '6', '-row-mt', '1'],
+    "libsvtav1": ['-preset', '8']
+}
+
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_capabilities():
+    """Names of the encoders and muxers the local ffmpeg was built with."""
+    names = set()
+    for listing in ('-encoders', '-muxers'):
+        try:
+            output = subprocess.run(['ffmpeg', '-hide_banner', listing], stdout=subprocess.PIPE,
+                                    stderr=subprocess.DEVNULL, text=True).stdout
+        except OSError:
+            continue
+        names.update(line.split()[1] for line in output.splitlines() if len(line.split()) > 1)
+    return frozenset(names)
+
+
+def image_encoder(image_format):
+    """The encoder to use for an image format, or None when the local ffmpeg can't write it."""
+    if image_format == "avif" and "avif" not in ffmpeg_capabilities():
+        return None
+    for encoder in IMAGE_FORMATS[image_format]["encoders"]:
+        if encoder == "mjpeg" or encoder in ffmpeg_capabilities():
+            return encoder
+    return None
+
+
+def resolve_image_format(image_format):
+    """The requested image format, or the closest one the local ffmpeg supports."""
+    for candidate in IMAGE_FORMAT_FALLBACKS[image_format]:
+        if image_encoder(candidate):
+            return candidate
+    return "jpg"
+
+
+def get_profile(name=None):
+    name = name or PERFORMANCE_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown performance profile: {name}")
+    return PROFILES[name]
+
+
+class FFmpegCommand:
+    """Builds ffmpeg argument lists with the thread, decoder, scaler and encoder settings of a profile.
+
+    Calls chain and build() returns the list for run_ffmpeg:
+
+        FFmpegCommand().input(video_file, thumbnail_decode=True).filter_complex(graph).image_output(path, "[out]").build()
+    """
+
+    def __init__(self, profile=None, loglevel="error"):
+        self.profile = get_profile(profile)
+        self.args = ['ffmpeg', '-y', '-hide_banner', '-nostats', '-v', loglevel]
+        if self.profile["filter_threads"]:
+            self.args += ['-filter_threads', str(self.profile["filter_threads"]),
+                          '-filter_complex_threads', str(self.profile["filter_threads"])]
+
+    @property
+    def image_extension(self):
+        return self.profile["image_format"]
+
+    def scale(self, width, height):
+        return f"scale={width}:{height}:flags={self.profile['scaler']}"
+
+    def input(self, source, seek=None, keyframes_only=False, thumbnail_decode=False):
+        """Add an input; thumbnail_decode enables the cheaper decoding used for frames that are scaled down."""
+        if seek is not None:
+            self.args += ['-ss', str(seek)]  # Before -i, so the demuxer seeks instead of decoding up to it
+        if self.profile["threads"]:
+            self.args += ['-threads', str(self.profile["threads"])]
+        if keyframes_only:
+            self.args += ['-skip_frame', 'nokey']
+        if thumbnail_decode:
+            if self.profile["lowres"]:
+                self.args += ['-lowres', str(self.profile["lowres"])]
+            if self.profile["skip_loop_filter"]:
+                self.args += ['-skip_loop_filter', 'all']
+        self.args += input_args(source)
+        return self
+
+    def option(self, *args):
+        self.args += [str(arg) for arg in args]
+        return self
+
+    def filter_complex(self, graph):
+        self.args += ['-filter_complex', graph]
+        return self
+
+    def output(self, path, *options):
+        self.args += [str(option) for option in options] + [path]
+        return self
+
+    def image_options(self, image_format=None, quality=None):
+        image_format = image_format or self.profile["image_format"]
+        encoder = image_encoder(image_format)
+        if quality is None:
+            quality = self.profile[f"{'jpeg' if image_format == 'jpg' else image_format}_quality"]
+        options = ['-c:v', encoder, IMAGE_FORMATS[image_format]["quality_option"], str(quality)]
+        if image_format == "avif":
+            options += ['-g', '1']  # Every frame is an image of its own
+        return options + ENCODER_OPTIONS.get(encoder, [])
+
+    def image_output(self, path, label=None, frames=None, start_number=None, image_format=None, quality=None,
+                     video_filter=None):
+        """Add an image (sequence) output for a filter label, encoded with the profile's format and quality."""
+        options = ['-map', label] if label else []
+        if video_filter:
+            options += ['-vf', video_filter]
+        if frames is not None:
+            options += ['-frames:v', str(frames)]
+        image_format = image_format or self.profile["image_format"]
+        if image_format == "avif" and "%d" in path:
+            # image2 would write bare AV1 frames, so cut the stream into one AVIF file per frame instead
+            options += ['-f', 'segment', '-segment_time', '0.001', '-segment_format', 'avif', '-reset_timestamps', '1']
+            if start_number is not None:
+                options += ['-segment_start_number', str(start_number)]
+        elif start_number is not None:
+            options += ['-start_number', str(start_number)]
+        return self.output(path, *options, *self.image_options(image_format, quality))
+
+    def x264_options(self, stream=None):
+        """libx264 with the profile's preset, for all video streams or the output stream index given."""
+        suffix = f":v:{stream}" if stream is not None else ":v"
+        return [f"-c{suffix}", 'libx264', f"-preset{suffix}", self.profile["x264_preset"]]
+
+    def build(self):
+        return list(self.args)
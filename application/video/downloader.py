@@ -0,0 +1,285 @@
+import base64
+import hashlib
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+MAX_WORKERS = 8  # Parallel range requests per download
+SEGMENT_SIZE = 16 * 1024 * 1024
+MIN_PARALLEL_SIZE = 32 * 1024 * 1024  # Smaller files are fetched with a single request
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT = 30
+
+
+class DownloadError(Exception):
+    pass
+
+
+class ObjectChanged(DownloadError):
+    pass
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def check_public_url(url, allowed_hosts=(), resolve=True):
+    """Raise DownloadError unless url is http(s) and its host only resolves to public addresses.
+
+    Hosts in allowed_hosts skip the address check, e.g. the local storage server. Without
+    resolve, only hosts given as IP addresses are checked, so no DNS lookup is made.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise DownloadError(f"Not an http(s) url: {url}")
+    if parsed.hostname.lower() in allowed_hosts:
+        return
+    try:
+        addresses = {str(ipaddress.ip_address(parsed.hostname))}
+    except ValueError:
+        if not resolve:
+            return
+        try:
+            addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or None)}
+        except (socket.gaierror, ValueError) as e:
+            raise DownloadError(f"Could not resolve {parsed.hostname}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise DownloadError(f"{parsed.hostname} resolves to a non-public address ({ip})")
+
+
+def check_redirect(response, *args, **kwargs):
+    # Redirects are followed by requests itself, so their targets are checked before the next hop
+    if response.is_redirect:
+        check_public_url(urljoin(response.url, response.headers['Location']), Config.VIDEO_ALLOWED_HOSTS)
+
+
+def get_session():
+    """Process-wide HTTP session, so connections are pooled across downloads and segments."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            # Transparent gzip would break Range offsets and size checks
+            _session.headers['Accept-Encoding'] = 'identity'
+            _session.hooks['response'].append(check_redirect)
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS * 2, max_retries=3)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def expected_md5_from_headers(headers):
+    for part in headers.get('x-goog-hash', '').split(','):
+        if part.strip().startswith('md5='):
+            return part.strip()[4:]
+    return headers.get('Content-MD5')
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest
+
+
+def verify(path, size=None, md5=None):
+    """Check the downloaded size and, when known, the MD5 given as hex or base64."""
+    actual_size = os.path.getsize(path)
+    if size is not None and actual_size != size:
+        raise DownloadError(f"Size mismatch for {path}: expected {size} bytes, got {actual_size}")
+    if md5:
+        digest = file_md5(path)
+        if md5 not in (digest.hexdigest(), base64.b64encode(digest.digest()).decode()):
+            raise DownloadError(f"MD5 mismatch for {path}")
+
+
+class Progress:
+    def __init__(self, total, callback):
+        self.total = total
+        self.done = 0
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+            done = self.done
+        if self.callback:
+            self.callback(done, self.total)
+
+
+def range_validator(headers):
+    """ETag or Last-Modified to send as If-Range; weak ETags can't be used there."""
+    etag = headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return headers.get('Last-Modified')
+
+
+def discard_partial(part_file):
+    for path in (part_file, part_file + ".json", part_file + ".validator"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def load_state(state_file, url, size, etag):
+    """Completed segments of an interrupted download of the same object, if any."""
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return set()
+    if state.get('url') != url or state.get('size') != size or state.get('etag') != etag:
+        return set()
+    return set(state.get('done', []))
+
+
+def save_state(state_file, url, size, etag, done):
+    temporary_file = state_file + ".tmp"
+    with open(temporary_file, 'w') as f:
+        json.dump({'url': url, 'size': size, 'etag': etag, 'done': sorted(done)}, f)
+    os.replace(temporary_file, state_file)
+
+
+def preallocate(path, size):
+    with open(path, 'wb') as f:
+        if hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, size)
+        else:
+            f.truncate(size)
+
+
+def download_segments(session, url, part_file, size, validator, workers, segment_size, progress, timeout):
+    state_file = part_file + ".json"
+    segments = [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+    # Without a validator a changed object can't be told apart from the one in the partial file
+    done = load_state(state_file, url, size, validator) if validator and os.path.exists(part_file) else set()
+    if not done:
+        discard_partial(part_file)
+        preallocate(part_file, size)
+    progress.add(sum(end - start + 1 for index, (start, end) in enumerate(segments) if index in done))
+    state_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def fetch(index):
+        start, end = segments[index]
+        headers = {'Range': f"bytes={start}-{end}"}
+        if validator:
+            headers['If-Range'] = validator
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+            if response.status_code == 200 and validator:
+                raise ObjectChanged(f"{url} changed during the download")
+            if response.status_code != 206:
+                raise DownloadError(f"Server ignored range request for {url} (status {response.status_code})")
+            with open(part_file, 'r+b') as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if stopped.is_set():
+                        return
+                    f.write(chunk)
+                    progress.add(len(chunk))
+        with state_lock:
+            done.add(index)
+            save_state(state_file, url, size, validator, done)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch, index) for index in range(len(segments)) if index not in done]
+        finished, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = next((future for future in finished if future.exception()), None)
+        if failed is not None:
+            # Report the first failure now instead of after every other segment
+            stopped.set()
+            for future in pending:
+                future.cancel()
+            if isinstance(failed.exception(), ObjectChanged):
+                discard_partial(part_file)
+            raise failed.exception()
+
+    os.remove(state_file)
+
+
+def read_validator(validator_file):
+    try:
+        with open(validator_file) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def download_stream(session, url, part_file, accept_ranges, validator, progress, timeout):
+    """Single request download, resuming from the end of an existing partial file when possible.
+
+    A partial file is only resumed when it was written for the same validator, and the
+    request carries If-Range, so a changed object is sent in full instead of appended.
+    """
+    validator_file = part_file + ".validator"
+    resumable = (accept_ranges and validator and os.path.exists(part_file)
+                 and not os.path.exists(part_file + ".json") and read_validator(validator_file) == validator)
+    offset = os.path.getsize(part_file) if resumable else 0
+    headers = {'Range': f"bytes={offset}-", 'If-Range': validator} if offset else {}
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416:
+            # The partial file doesn't fit the object (already complete, or another version): start over
+            discard_partial(part_file)
+            return download_stream(session, url, part_file, accept_ranges, validator, progress, timeout)
+        response.raise_for_status()
+        if response.status_code != 206:
+            offset = 0
+            if validator:
+                with open(validator_file, 'w') as f:
+                    f.write(validator)
+        progress.add(offset)
+        with open(part_file, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                f.write(chunk)
+                progress.add(len(chunk))
+
+
+def download(url, output_path, workers=MAX_WORKERS, segment_size=SEGMENT_SIZE, expected_md5=None,
+             progress=None, session=None, timeout=TIMEOUT):
+    """Download url to output_path and return output_path.
+
+    Large files on servers that accept ranges are fetched as parallel Range segments into a
+    preallocated file. Data is written to output_path + ".part" and completed segments are
+    recorded next to it, so calling download again after an interruption resumes the
+    transfer. The result is checked against the Content-Length and, when the server or
+    caller provides one, the MD5. progress(done_bytes, total_bytes) is called as data arrives.
+    """
+    session = session or get_session()
+    head = session.head(url, allow_redirects=True, timeout=timeout)
+    head.raise_for_status()
+    size = int(head.headers['Content-Length']) if 'Content-Length' in head.headers else None
+    validator = range_validator(head.headers)
+    accept_ranges = head.headers.get('Accept-Ranges', '').lower() == 'bytes'
+    expected_md5 = expected_md5 or expected_md5_from_headers(head.headers)
+
+    part_file = output_path + ".part"
+    tracker = Progress(size, progress)
+    if size is not None and accept_ranges and size >= MIN_PARALLEL_SIZE and workers > 1:
+        logging.info(f"Downloading {url} in {-(-size // segment_size)} segments...")
+        download_segments(session, head.url, part_file, size, validator, workers, segment_size, tracker, timeout)
+    else:
+        download_stream(session, head.url, part_file, accept_ranges, validator, tracker, timeout)
+
+    try:
+        verify(part_file, size, expected_md5)
+    except DownloadError:
+        # A corrupt partial file would otherwise be resumed (or answered with 416) on every retry
+        discard_partial(part_file)
+        raise
+    os.replace(part_file, output_path)
+    discard_partial(part_file)
+    return output_path
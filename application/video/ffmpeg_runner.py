@@ -0,0 +1,69 @@
+import os
+import subprocess
+import tempfile
+import time
+
+from application import tracing
+
+# Shared across the worker processes of a batch to cap concurrent ffmpeg runs
+encode_slots = None
+
+
+def init_worker(slots):
+    global encode_slots
+    encode_slots = slots
+
+
+def run_ffmpeg(command, **kwargs):
+    tracing.count("ffmpeg_spawns")
+    if encode_slots is None:
+        return subprocess.run(command, **kwargs)
+    with encode_slots:
+        return subprocess.run(command, **kwargs)
+
+
+def run_ffmpeg_watching(command, frame_files, on_frame, poll_interval=0.1):
+    """Run ffmpeg and call on_frame(key, index, path) for each output file as soon as it is complete.
+
+    frame_files maps a key to the ordered list of paths ffmpeg will write for it. A file is
+    complete once its successor exists or ffmpeg has exited, so the caller can upload
+    earlier frames while later ones are still being extracted.
+    """
+    next_index = {key: 0 for key in frame_files}
+    tracing.count("ffmpeg_spawns")
+    with tempfile.TemporaryFile() as stderr:
+        if encode_slots is not None:
+            encode_slots.acquire()
+        try:
+            process = subprocess.Popen(command, stderr=stderr)
+            while True:
+                finished = process.poll() is not None
+                for key, paths in frame_files.items():
+                    while next_index[key] < len(paths):
+                        index = next_index[key]
+                        ready = finished or (index + 1 < len(paths) and os.path.exists(paths[index + 1]))
+                        if not ready:
+                            break
+                        if os.path.exists(paths[index]):
+                            on_frame(key, index, paths[index])
+                        next_index[key] += 1
+                if finished:
+                    break
+                time.sleep(poll_interval)
+        finally:
+            if encode_slots is not None:
+                encode_slots.release()
+
+        stderr.seek(0)
+        return process.returncode, stderr.read().decode(errors='replace').strip()
+
+
+def is_remote(source):
+    return source.startswith(('http://', 'https://'))
+
+
+def input_args(source):
+    """ffmpeg arguments to open a local file or URL; URLs reconnect instead of failing mid-read."""
+    if is_remote(source):
+        return ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5', '-i', source]
+    return ['-i', source]
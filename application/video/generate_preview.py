@@ -1,7 +1,8 @@
 import subprocess
-import ffmpeg
 import os
 
+from application.video.command_builder import FFmpegCommand
+
 # Configuration
 mpd_url = "https://storage.googleapis.com/wvmedia/cenc/h264/tears/tears.mpd"
 drm_license_url = "https://proxy.uat.widevine.com/proxy?video_id=GTS_SW_SECURE_CRYPTO&provider=widevine_test"
@@ -32,6 +33,8 @@ if not os.path.exists(decrypted_file):
     exit(1)
 
 # Step 2: Trim the decrypted video using ffmpeg
-ffmpeg.input(decrypted_file, ss=start_time, t=end_time - start_time).output(output_file).run()
+trim_command = FFmpegCommand().input(decrypted_file, seek=start_time).output(
+    output_file, '-t', end_time - start_time, *FFmpegCommand().x264_options(), '-c:a', 'aac')
+subprocess.run(trim_command.build(), check=True)
 
 print(f"Preview saved to {output_file}")
@@ -4,6 +4,8 @@ from http.server import SimpleHTTPRequestHandler, HTTPServer
 import json
 import shutil
 
+from application.video.command_builder import FFmpegCommand
+
 # Configuration
 VIDEO_URL = "https://storage.googleapis.com/smoothscroll-7252a.appspot.com/videos/1_20240812063339_5927708-hd_1080_1920_30fps.mp4"
 THUMBNAIL_DIR = "../../outputs/thumbnails"
@@ -26,7 +28,7 @@ def cleanup_files():
 def download_video(video_url):
     # Use ffmpeg to download the video
     output_file = "video.mp4"
-    subprocess.run(['ffmpeg', '-i', video_url, '-c', 'copy', output_file], check=True)
+    subprocess.run(FFmpegCommand().input(video_url).output(output_file, '-c', 'copy').build(), check=True)
     return output_file
 
 def generate_thumbnails(video_file):
@@ -39,11 +41,12 @@ def generate_thumbnails(video_file):
         timestamp = index * THUMBNAIL_INTERVAL
         thumbnail_data = {"small": [], "medium": {}}
         for size_name, resolution in THUMBNAIL_SIZES.items():
-            thumbnail_file = os.path.join(THUMBNAIL_DIR, f"{size_name}_thumbnail_{timestamp}.jpg")
-            result = subprocess.run(
-                ['ffmpeg', '-i', video_file, '-ss', str(timestamp), '-vframes', '1', '-s', resolution, thumbnail_file],
-                stderr=subprocess.PIPE
-            )
+            # Seek the input instead of decoding up to the timestamp, with the profile's decoder, scaler and quality
+            command = FFmpegCommand().input(video_file, seek=timestamp, thumbnail_decode=True)
+            thumbnail_file = os.path.join(THUMBNAIL_DIR, f"{size_name}_thumbnail_{timestamp}.{command.image_extension}")
+            width, height = resolution.split("x")
+            command.image_output(thumbnail_file, frames=1, video_filter=command.scale(width, height))
+            result = subprocess.run(command.build(), stderr=subprocess.PIPE)
 
             # Break if ffmpeg fails or thumbnail is not created
             if result.returncode != 0 or not os.path.exists(thumbnail_file):
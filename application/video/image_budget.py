@@ -0,0 +1,111 @@
+import logging
+import os
+import subprocess
+
+from application.video.command_builder import IMAGE_FORMATS, FFmpegCommand
+from application.video.ffmpeg_runner import run_ffmpeg
+
+SAMPLE_COUNT = 3  # Frames spread over the video that every candidate quality is tried on
+
+
+def extract_samples(video_file, sizes, duration, output_dir, count=SAMPLE_COUNT):
+    """Decode a few frames spread over the video and write each at every size as lossless PNG.
+
+    sizes maps size names to (width, height). Returns {size_name: [sample files]}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    command = FFmpegCommand()
+    for index in range(count):
+        command.input(video_file, seek=round(duration * (index + 1) / (count + 1), 3), thumbnail_decode=True)
+
+    chains = []
+    outputs = []
+    for index in range(count):
+        labels = [f"i{index}s{number}" for number in range(len(sizes))]
+        chains.append(f"[{index}:v]split={len(labels)}" + "".join(f"[{label}]" for label in labels))
+        for label, (size_name, (width, height)) in zip(labels, sizes.items()):
+            chains.append(f"[{label}]{command.scale(width, height)}[{label}out]")
+            outputs.append((size_name, f"[{label}out]", os.path.join(output_dir, f"{size_name}_sample_{index}.png")))
+    command.filter_complex(";".join(chains))
+    for size_name, label, path in outputs:
+        command.output(path, '-map', label, '-frames:v', '1')
+
+    result = run_ffmpeg(command.build(), stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        logging.warning(f"Sample frame extraction failed: {result.stderr.decode(errors='replace').strip()}")
+    samples = {size_name: [] for size_name in sizes}
+    for size_name, _, path in outputs:
+        if os.path.exists(path):
+            samples[size_name].append(path)
+    return samples
+
+
+def encode_samples(samples, image_format, qualities, output_dir):
+    """Encode the samples of every size at its candidate quality in one ffmpeg run.
+
+    Returns {size_name: bytes of its largest encoded sample}, None when encoding failed.
+    """
+    command = FFmpegCommand()
+    extension = image_format
+    outputs = []
+    for size_name, quality in qualities.items():
+        for sample_file in samples[size_name]:
+            command.input(sample_file)
+            name = os.path.splitext(os.path.basename(sample_file))[0]
+            outputs.append((size_name, os.path.join(output_dir, f"{name}_q{quality}.{extension}")))
+    for index, (size_name, path) in enumerate(outputs):
+        command.image_output(path, f"{index}:v", image_format=image_format, quality=qualities[size_name])
+
+    result = run_ffmpeg(command.build(), stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        logging.warning(f"Sample encoding failed: {result.stderr.decode(errors='replace').strip()}")
+    encoded = {size_name: 0 for size_name in qualities}
+    for size_name, path in outputs:
+        if encoded[size_name] is None:
+            continue
+        if not os.path.exists(path):
+            encoded[size_name] = None
+            continue
+        encoded[size_name] = max(encoded[size_name], os.path.getsize(path))
+        os.remove(path)
+    return encoded
+
+
+def fit_qualities(samples, image_format, budgets, output_dir):
+    """Binary search per size for the best quality whose largest sample stays within the byte budget.
+
+    All sizes are searched in lockstep, so every step is a single ffmpeg run. Sizes without
+    a budget or samples get no entry and keep the profile's quality.
+    """
+    spec = IMAGE_FORMATS[image_format]
+    direction = 1 if spec["best"] > spec["worst"] else -1
+    span = abs(spec["best"] - spec["worst"])
+    # Steps count up from the worst quality, so a higher step always means a bigger file
+    bounds = {size_name: [0, span] for size_name, files in samples.items() if files and budgets.get(size_name)}
+    chosen = {size_name: 0 for size_name in bounds}
+    while any(low <= high for low, high in bounds.values()):
+        steps = {size_name: (low + high) // 2 for size_name, (low, high) in bounds.items() if low <= high}
+        encoded = encode_samples(samples, image_format,
+                                 {size_name: spec["worst"] + direction * step for size_name, step in steps.items()},
+                                 output_dir)
+        for size_name, step in steps.items():
+            if encoded[size_name] is None:
+                bounds[size_name] = [1, 0]  # Give up on this size and keep the lowest quality
+            elif encoded[size_name] <= budgets[size_name]:
+                chosen[size_name] = step
+                bounds[size_name][0] = step + 1
+            else:
+                bounds[size_name][1] = step - 1
+    return {size_name: spec["worst"] + direction * step for size_name, step in chosen.items()}
+
+
+def choose_qualities(video_file, sizes, duration, image_format, budgets, output_dir):
+    """The quality per size that keeps thumbnails of this video within their byte budgets."""
+    sample_dir = os.path.join(output_dir, "samples")
+    samples = extract_samples(video_file, sizes, duration, sample_dir)
+    qualities = fit_qualities(samples, image_format, budgets, sample_dir)
+    for sample_files in samples.values():
+        for sample_file in sample_files:
+            os.remove(sample_file)
+    logging.info(f"Chose {image_format} qualities {qualities} for byte budgets {budgets}.")
+    return qualities
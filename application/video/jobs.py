@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+
+from config import Config
+from models import VideoJob
+from models.user import db
+
+SKIP_LOCKED_DIALECTS = ("postgresql", "mysql", "mariadb")
+CLAIM_ATTEMPTS = 5  # Candidates tried per claim when other workers win the race
+
+
+def enqueue(video_infos, max_attempts=None, submitted_by=None):
+    """Queue one job per video_info dict (as passed to process_video) and return the job ids."""
+    jobs = [
+        VideoJob(url=info['url'], video_info=info, submitted_by=submitted_by, status='queued', stages={},
+                 attempts=0, max_attempts=max_attempts or Config.JOB_MAX_ATTEMPTS)
+        for info in video_infos
+    ]
+    db.session.add_all(jobs)
+    db.session.commit()
+    return [job.id for job in jobs]
+
+
+def is_finished(job):
+    return job.status in ('completed', 'skipped', 'failed')
+
+
+def job_status(job):
+    return {
+        "job_id": job.id,
+        "url": job.url,
+        "status": job.status,
+        "stages": job.stages or {},
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None
+    }
+
+
+def claimable(now):
+    # Queued jobs whose retry delay has passed, and running jobs whose worker stopped renewing the lease
+    return and_(VideoJob.status.in_(('queued', 'running')),
+                or_(VideoJob.locked_until.is_(None), VideoJob.locked_until < now))
+
+
+def owned(job_id, worker_id, attempt):
+    return and_(VideoJob.id == job_id, VideoJob.worker_id == worker_id, VideoJob.attempts == attempt,
+                VideoJob.status == 'running')
+
+
+def claim_job(worker_id, visibility_timeout=None):
+    """Lease the oldest claimable job to worker_id and return it, or None when there is none.
+
+    On PostgreSQL and MySQL the candidate row is locked with FOR UPDATE SKIP LOCKED, so
+    concurrent workers pick different jobs. SQLite has no row locks, so every claim is a
+    conditional UPDATE on the attempt count that only one worker can win. A job stays
+    invisible to other workers until its lease runs out.
+    """
+    visibility_timeout = visibility_timeout or Config.JOB_VISIBILITY_TIMEOUT
+    skip_locked = db.engine.dialect.name in SKIP_LOCKED_DIALECTS
+
+    for _ in range(CLAIM_ATTEMPTS):
+        now = datetime.utcnow()
+        query = VideoJob.query.filter(claimable(now)).order_by(VideoJob.id)
+        if skip_locked:
+            query = query.with_for_update(skip_locked=True)
+        job = query.first()
+        if job is None:
+            db.session.rollback()
+            return None
+
+        race = and_(VideoJob.id == job.id, VideoJob.attempts == job.attempts, claimable(now))
+        if job.attempts >= job.max_attempts:
+            # The worker running the last attempt died without reporting back
+            VideoJob.query.filter(race).update({
+                "status": "failed",
+                "locked_until": None,
+                "error": job.error or f"Lease expired after {job.attempts} attempts"
+            }, synchronize_session=False)
+            db.session.commit()
+            continue
+
+        claimed = VideoJob.query.filter(race).update({
+            "status": "running",
+            "worker_id": worker_id,
+            "attempts": job.attempts + 1,
+            "locked_until": now + timedelta(seconds=visibility_timeout)
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(VideoJob, job.id)
+    return None
+
+
+def extend_lease(job_id, worker_id, attempt, visibility_timeout=None):
+    """Push the lease forward; returns False when the job is no longer held by this worker."""
+    visibility_timeout = visibility_timeout or Config.JOB_VISIBILITY_TIMEOUT
+    extended = VideoJob.query.filter(owned(job_id, worker_id, attempt)).update({
+        "locked_until": datetime.utcnow() + timedelta(seconds=visibility_timeout)
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(extended)
+
+
+def update_stage(job_id, worker_id, attempt, stage, status, error=None, visibility_timeout=None, artifact=None):
+    """Record the status of one processing stage and renew the lease at the same time.
+
+    The artifact of a completed stage is kept on the job, so a retry on any node skips it.
+    """
+    job = VideoJob.query.filter(owned(job_id, worker_id, attempt)).first()
+    if job is None:
+        db.session.rollback()
+        return False
+
+    entry = {"status": status, "attempt": attempt, "updated_at": datetime.utcnow().isoformat()}
+    if error:
+        entry["error"] = error
+    # Assign a new dict, in-place changes to a JSON column are not tracked
+    job.stages = dict(job.stages or {}, **{stage: entry})
+    if artifact is not None:
+        job.artifacts = dict(job.artifacts or {}, **{stage: artifact})
+    job.locked_until = datetime.utcnow() + timedelta(seconds=visibility_timeout or Config.JOB_VISIBILITY_TIMEOUT)
+    db.session.commit()
+    return True
+
+
+def complete_job(job_id, worker_id, attempt, result):
+    completed = VideoJob.query.filter(owned(job_id, worker_id, attempt)).update({
+        "status": "completed" if result is not None else "skipped",
+        "result": result,
+        "error": None,
+        "locked_until": None
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(completed)
+
+
+def fail_job(job_id, worker_id, attempt, error, retry_delay=None):
+    """Put the job back in the queue after retry_delay, or mark it failed on its last attempt.
+
+    A retry only rebuilds the stages that failed or never ran: completed ones are passed
+    back to process_video from the job's artifacts column.
+    """
+    job = VideoJob.query.filter(owned(job_id, worker_id, attempt)).first()
+    if job is None:
+        db.session.rollback()
+        return False
+
+    job.error = error
+    if job.attempts < job.max_attempts:
+        job.status = "queued"
+        job.locked_until = datetime.utcnow() + timedelta(seconds=retry_delay or Config.JOB_RETRY_DELAY)
+    else:
+        job.status = "failed"
+        job.locked_until = None
+    db.session.commit()
+    return True
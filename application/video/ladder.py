@@ -0,0 +1,98 @@
+import logging
+import os
+import subprocess
+
+from application.video.command_builder import FFmpegCommand
+from application.video.ffmpeg_runner import run_ffmpeg
+
+# (short side in pixels, video kbps, audio kbps), from the top rung down
+LADDER = [
+    (1080, 5000, 128),
+    (720, 2800, 128),
+    (480, 1400, 96),
+    (360, 800, 64),
+    (240, 400, 64)
+]
+SEGMENT_DURATION = 4  # Seconds per HLS segment; every segment starts on a keyframe
+
+
+def even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def select_renditions(width, height, ladder=LADDER):
+    """Pick the ladder rungs that fit the source, so nothing is upscaled.
+
+    Returns dicts with the output width/height (aspect preserved, even sizes) and bitrates.
+    A source smaller than the lowest rung gets a single rendition at its own size.
+    """
+    short_side = min(width, height)
+    rungs = [rung for rung in ladder if rung[0] <= short_side] or [(short_side,) + tuple(ladder[-1][1:])]
+
+    renditions = []
+    for short, video_bitrate, audio_bitrate in rungs:
+        scale = short / short_side
+        renditions.append({
+            "width": even(width * scale),
+            "height": even(height * scale),
+            "video_bitrate": video_bitrate,
+            "audio_bitrate": audio_bitrate
+        })
+    return renditions
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def package_hls(video_file, output_dir, renditions, duration, fps=30, has_audio=True,
+                segment_duration=SEGMENT_DURATION):
+    """Transcode every rendition from a single decode and package them as HLS with fMP4 (CMAF) segments.
+
+    Writes output_dir/master.m3u8 plus one stream_<index>/ directory per rendition. Returns
+    the rendition dicts extended with their playlist path and measured size and bitrate, or
+    an empty list when ffmpeg fails.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    command = FFmpegCommand().input(video_file)
+    count = len(renditions)
+    chains = [f"[0:v]split={count}" + "".join(f"[v{index}]" for index in range(count))]
+    gop = str(max(1, int(round(fps * segment_duration))))
+
+    outputs = []
+    stream_map = []
+    for index, rendition in enumerate(renditions):
+        chains.append(f"[v{index}]{command.scale(rendition['width'], rendition['height'])}[vo{index}]")
+        bitrate = f"{rendition['video_bitrate']}k"
+        outputs += ['-map', f"[vo{index}]", *command.x264_options(index), f"-b:v:{index}", bitrate,
+                    f"-maxrate:v:{index}", bitrate, f"-bufsize:v:{index}", f"{rendition['video_bitrate'] * 2}k"]
+        if has_audio:
+            outputs += ['-map', '0:a:0', f"-c:a:{index}", 'aac', f"-b:a:{index}", f"{rendition['audio_bitrate']}k"]
+            stream_map.append(f"v:{index},a:{index}")
+        else:
+            stream_map.append(f"v:{index}")
+
+    command.filter_complex(";".join(chains)).output(
+        os.path.join(output_dir, "stream_%v", "playlist.m3u8"),
+        *outputs,
+        # Aligned GOPs across renditions so players can switch at any segment boundary
+        '-g', gop, '-keyint_min', gop, '-sc_threshold', '0',
+        '-f', 'hls', '-hls_time', segment_duration, '-hls_playlist_type', 'vod',
+        '-hls_segment_type', 'fmp4', '-hls_flags', 'independent_segments',
+        '-master_pl_name', 'master.m3u8', '-var_stream_map', " ".join(stream_map),
+        '-hls_segment_filename', os.path.join(output_dir, "stream_%v", "segment_%05d.m4s"))
+
+    result = run_ffmpeg(command.build(), stderr=subprocess.PIPE)
+    if result.returncode != 0 or not os.path.exists(os.path.join(output_dir, "master.m3u8")):
+        logging.warning(f"HLS packaging failed: {result.stderr.decode(errors='replace').strip()}")
+        return []
+
+    packaged = []
+    for index, rendition in enumerate(renditions):
+        stream_dir = os.path.join(output_dir, f"stream_{index}")
+        size = directory_size(stream_dir)
+        packaged.append(dict(rendition,
+                             playlist=os.path.join(f"stream_{index}", "playlist.m3u8"),
+                             bytes=size,
+                             actual_bitrate=int(size * 8 / 1000 / duration) if duration else 0))
+    return packaged
@@ -0,0 +1,111 @@
+import logging
+import os
+import subprocess
+
+from application.video.command_builder import FFmpegCommand
+from application.video.ffmpeg_runner import run_ffmpeg
+from application.video.probe import ProbeError, keyframe_times
+
+
+def normalize_ranges(preview_times, duration):
+    """Clip (start, end) ranges to the video duration and drop the ones that fall outside it."""
+    ranges = []
+    for start_time, end_time in preview_times:
+        end_time = min(end_time, duration)
+        if start_time < end_time:
+            ranges.append((start_time, end_time))
+    return ranges
+
+
+def cut_copy(video_file, ranges, output_dir):
+    """Stream copy every range from one ffmpeg run, with one seeked input per range.
+
+    Each input seeks to the keyframe before its range, so a clip starts up to a GOP early;
+    that keyframe is looked up with one ffprobe run and reported as cut_start. cut_end is
+    the requested end, which the clip reaches to within a frame.
+    """
+    command = FFmpegCommand()
+    outputs = []
+    for index, (start_time, end_time) in enumerate(ranges):
+        # -t before -i limits what is read from this input; seeking it jumps to the keyframe
+        command.option('-t', round(end_time - start_time, 3)).input(video_file, seek=start_time)
+        preview_file = os.path.join(output_dir, f"preview_{start_time}_{end_time}.mp4")
+        outputs.append(preview_file)
+        command.output(preview_file, '-map', f"{index}:v:0", '-map', f"{index}:a:0?", '-c', 'copy',
+                       '-avoid_negative_ts', 'make_zero', '-movflags', '+faststart')
+    result = run_ffmpeg(command.build(), stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        logging.warning(f"Preview cutting failed: {result.stderr.decode(errors='replace').strip()}")
+        return []
+
+    try:
+        cut_starts = keyframe_times(video_file, [start_time for start_time, _ in ranges])
+    except ProbeError as e:
+        logging.warning(f"Could not look up the preview keyframes, reporting the requested starts: {e}")
+        cut_starts = [start_time for start_time, _ in ranges]
+
+    clips = []
+    for preview_file, (start_time, end_time), cut_start in zip(outputs, ranges, cut_starts):
+        clips.append({
+            "file": preview_file,
+            "start_time": start_time,
+            "end_time": end_time,
+            "cut_start": cut_start,
+            "cut_end": end_time
+        })
+    return clips
+
+
+def cut_transcode(video_file, ranges, output_dir, has_audio, height, video_bitrate, audio_bitrate):
+    """Frame-accurate low bitrate previews: one decode, split into a trimmed encoder per range."""
+    offset = ranges[0][0]
+    count = len(ranges)
+    chains = [f"[0:v]split={count}" + "".join(f"[v{index}]" for index in range(count))]
+    if has_audio:
+        chains.append(f"[0:a]asplit={count}" + "".join(f"[a{index}]" for index in range(count)))
+
+    command = FFmpegCommand().input(video_file, seek=offset)
+    outputs = []
+    for index, (start_time, end_time) in enumerate(ranges):
+        # The input is already seeked to the first range, so trim relative to it
+        start, end = start_time - offset, end_time - offset
+        chains.append(f"[v{index}]trim=start={start}:end={end},setpts=PTS-STARTPTS,{command.scale(-2, height)}[vo{index}]")
+        maps = ['-map', f"[vo{index}]"]
+        if has_audio:
+            chains.append(f"[a{index}]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[ao{index}]")
+            maps += ['-map', f"[ao{index}]", '-c:a', 'aac', '-b:a', audio_bitrate]
+        preview_file = os.path.join(output_dir, f"preview_{start_time}_{end_time}.mp4")
+        outputs.append((preview_file, maps + command.x264_options() + [
+            '-b:v', video_bitrate, '-maxrate', video_bitrate, '-bufsize', video_bitrate, '-movflags', '+faststart']))
+
+    command.filter_complex(";".join(chains))
+    for preview_file, options in outputs:
+        command.output(preview_file, *options)
+    result = run_ffmpeg(command.build(), stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        logging.warning(f"Preview transcoding failed: {result.stderr.decode(errors='replace').strip()}")
+
+    clips = []
+    for start_time, end_time in ranges:
+        preview_file = os.path.join(output_dir, f"preview_{start_time}_{end_time}.mp4")
+        if os.path.exists(preview_file):
+            clips.append({"file": preview_file, "start_time": start_time, "end_time": end_time,
+                          "cut_start": start_time, "cut_end": end_time})
+    return clips
+
+
+def create_previews(video_file, preview_times, duration, output_dir, mode="copy", has_audio=True,
+                    height=360, video_bitrate="600k", audio_bitrate="64k"):
+    """Cut all preview ranges of a video and report where each clip actually starts and ends.
+
+    "copy" cuts at keyframes without re-encoding; "transcode" cuts exactly and re-encodes
+    to a small H.264 rendition. Returns a list of dicts with the clip file, the requested
+    start_time/end_time and the achieved cut_start/cut_end, all in seconds.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    ranges = normalize_ranges(preview_times, duration)
+    if not ranges:
+        return []
+    if mode == "transcode":
+        return cut_transcode(video_file, sorted(ranges), output_dir, has_audio, height, video_bitrate, audio_bitrate)
+    return cut_copy(video_file, ranges, output_dir)
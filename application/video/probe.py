@@ -0,0 +1,160 @@
+import json
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Tuple
+
+from application import tracing
+
+CACHE_SIZE = 1024  # Probe results kept in memory per process
+CODEC_NAMES = {"h264": "H.264", "hevc": "H.265", "vp8": "VP8", "vp9": "VP9", "av1": "AV1", "mpeg4": "MPEG-4"}
+
+
+class ProbeError(Exception):
+    pass
+
+
+class AudioStream(NamedTuple):
+    codec: str
+    channels: int
+    sample_rate: int
+    bitrate: int  # bits per second, 0 when unknown
+
+
+class MediaProbe(NamedTuple):
+    duration: float  # seconds
+    width: int  # coded size of the first video stream
+    height: int
+    rotation: int  # degrees, as stored in the display matrix / rotate tag
+    fps: float
+    codec: str
+    bitrate: int  # bits per second, 0 when unknown
+    audio_streams: Tuple[AudioStream, ...] = ()
+
+    @property
+    def display_width(self):
+        """Width after applying rotation, which is what ffmpeg outputs by default."""
+        return self.height if self.rotation % 180 else self.width
+
+    @property
+    def display_height(self):
+        return self.width if self.rotation % 180 else self.height
+
+    @property
+    def has_audio(self):
+        return bool(self.audio_streams)
+
+    def to_dict(self):
+        data = self._asdict()
+        data['audio_streams'] = [stream._asdict() for stream in self.audio_streams]
+        data['display_width'] = self.display_width
+        data['display_height'] = self.display_height
+        return data
+
+
+def codec_display_name(codec):
+    return CODEC_NAMES.get(codec, codec.upper())
+
+
+def parse_rate(rate):
+    numerator, _, denominator = (rate or "0/1").partition('/')
+    try:
+        return float(numerator) / float(denominator or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def parse_rotation(stream):
+    rotation = stream.get('tags', {}).get('rotate')
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            rotation = side_data['rotation']
+    return int(float(rotation or 0)) % 360
+
+
+def parse_probe(data):
+    streams = data.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
+    if video is None:
+        raise ProbeError("No video stream found")
+    fmt = data.get('format', {})
+
+    audio_streams = tuple(
+        AudioStream(
+            codec=stream.get('codec_name', ''),
+            channels=int(stream.get('channels', 0)),
+            sample_rate=int(stream.get('sample_rate', 0)),
+            bitrate=int(stream.get('bit_rate', 0))
+        )
+        for stream in streams if stream.get('codec_type') == 'audio'
+    )
+    return MediaProbe(
+        duration=float(fmt.get('duration') or video.get('duration') or 0),
+        width=int(video['width']),
+        height=int(video['height']),
+        rotation=parse_rotation(video),
+        fps=parse_rate(video.get('avg_frame_rate')) or parse_rate(video.get('r_frame_rate')),
+        codec=video.get('codec_name', ''),
+        bitrate=int(video.get('bit_rate') or fmt.get('bit_rate') or 0),
+        audio_streams=audio_streams
+    )
+
+
+def run_ffprobe(source, timeout=None):
+    tracing.count("ffprobe_spawns")
+    command = ['ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', source]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise ProbeError(f"ffprobe timed out after {timeout}s for {source}")
+    if result.returncode != 0:
+        raise ProbeError(result.stderr.decode(errors='replace').strip() or f"ffprobe failed for {source}")
+    return json.loads(result.stdout)
+
+
+def keyframe_times(source, times, timeout=None):
+    """Where an input seek to each of times lands: the video keyframe at or before it.
+
+    One ffprobe run reads only the first video packet after each seek.
+    """
+    tracing.count("ffprobe_spawns")
+    command = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time',
+               '-read_intervals', ",".join(f"{time}%+#1" for time in times), '-of', 'csv=p=0', source]
+    try:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise ProbeError(f"ffprobe timed out after {timeout}s for {source}")
+    lines = [line.strip().rstrip(',') for line in result.stdout.decode().splitlines() if line.strip()]
+    if result.returncode != 0 or len(lines) != len(times):
+        raise ProbeError(result.stderr.decode(errors='replace').strip() or f"No keyframes found for {source}")
+    return [float(line) for line in lines]
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cache_key(source):
+    # Local files are keyed by modification time as well, so a rewritten file is probed again
+    try:
+        return source, os.stat(source).st_mtime_ns
+    except OSError:
+        return source, None
+
+
+def probe(source, timeout=None):
+    """Probe a local path or URL with a single ffprobe run, memoized per source (and mtime)."""
+    key = cache_key(source)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    media = parse_probe(run_ffprobe(source, timeout))
+
+    with _cache_lock:
+        _cache[key] = media
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return media
@@ -1,31 +1,69 @@
 import json
 import logging
+import math
 import os
 import shutil
 import subprocess
+import tempfile
 import uuid
-
-import firebase_admin
-from firebase_admin import credentials, storage
-
-# Firebase Admin SDK initialization
-cred = credentials.Certificate("./firebase-service-account-key.json")
-FIREBASE_STORAGE_BUCKET_NAME = "CHANGE YOUR STORAGE BUCKET HERE"
-
-firebase_admin.initialize_app(cred, {
-    'storageBucket': FIREBASE_STORAGE_BUCKET_NAME
-})
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
+from multiprocessing import BoundedSemaphore
+from urllib.parse import urlparse
+
+from application import tracing
+from application.uploader import get_uploader
+from application.video import downloader
+from application.video.cache import ProcessingCache, file_fingerprint, params_hash
+from application.video.command_builder import PERFORMANCE_PROFILE, FFmpegCommand, resolve_image_format
+from application.video.ffmpeg_runner import init_worker, is_remote, run_ffmpeg, run_ffmpeg_watching
+from application.video.image_budget import choose_qualities
+from application.video.ladder import LADDER, package_hls, select_renditions
+from application.video.preview import create_previews
+from application.video.probe import codec_display_name, probe
+from application.video.smart_thumbnails import select_frames
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, "../.."))
 
 # Configuration
-THUMBNAIL_DIR = "../../outputs/thumbnails"
+THUMBNAIL_DIR = os.path.join(PROJECT_DIR, "outputs/thumbnails")
 THUMBNAIL_INTERVAL = 1  # Interval in seconds to extract thumbnails
+# "interval" takes a frame every THUMBNAIL_INTERVAL seconds; "keyframe" only decodes keyframes and "scene"
+# takes the frames where the picture changes by more than SCENE_THRESHOLD. Both drop near-duplicate frames.
+THUMBNAIL_MODE = "interval"
+SCENE_THRESHOLD = 0.3
+THUMBNAIL_DEDUP_DISTANCE = 6  # Frames whose perceptual hashes differ in at most this many of 64 bits are duplicates
+ENABLE_POSTER = True  # Flag one representative thumbnail per video in the "keyframe" and "scene" modes
 THUMBNAIL_SIZES = {
     "small": 320,
     "medium": 640
 }
+# "jpg", or opt in to "webp" or "avif"; falls back to webp and then jpg when the local ffmpeg has no encoder for it
+THUMBNAIL_FORMAT = "jpg"
+# Largest file size in bytes per thumbnail size, e.g. {"small": 12 * 1024, "medium": 32 * 1024}. The encoder
+# quality is then searched per video to fit it, which costs a few extra ffmpeg runs; None keeps the profile's quality
+THUMBNAIL_BYTE_BUDGET = None
+ENABLE_SPRITES = True  # Also publish tiled sprite sheets with a WebVTT index
+SPRITE_COLUMNS = 5
+SPRITE_ROWS = 5
 PREVIEW_TIMES = [(5, 10), (15, 20)]  # Time ranges for preview clips
-LOG_FILE = "../../outputs/process_log.txt"
-OUTPUT_FILE = "../../outputs/response.json"
+PREVIEW_MODE = "copy"  # "copy" cuts at keyframes without re-encoding, "transcode" re-encodes a small rendition
+PREVIEW_HEIGHT = 360  # Used by the "transcode" mode
+PREVIEW_VIDEO_BITRATE = "600k"
+PREVIEW_AUDIO_BITRATE = "64k"
+ENABLE_ABR_LADDER = False  # Package an adaptive-bitrate HLS ladder after the other stages; costs a full multi-rung encode per job
+LADDER_SEGMENT_DURATION = 4
+LOG_FILE = os.path.join(PROJECT_DIR, "outputs/process_log.txt")
+OUTPUT_FILE = os.path.join(PROJECT_DIR, "outputs/response.json")
+WORK_DIR = os.path.join(PROJECT_DIR, "outputs/jobs")  # Every job gets its own scratch directory in here
+MAX_WORKERS = os.cpu_count() or 1  # Videos processed concurrently
+MAX_CONCURRENT_ENCODES = max(1, (os.cpu_count() or 1) // 2)  # ffmpeg runs allowed at once across all workers
+STREAM_REMOTE_INPUTS = True  # Probe and extract straight from HTTP(S) URLs instead of downloading first
+ENABLE_CACHE = True  # Reuse results of sources that were already processed with the same settings
+CACHE_DIR = os.path.join(PROJECT_DIR, "outputs/cache")
+CACHE_MAX_BYTES = 10 * 1024 ** 3  # Size bound for downloaded sources kept in the cache
+UPLOAD_CONCURRENCY = 16  # Parallel uploads per worker process; the backend is Config.STORAGE_BACKEND
 
 # Setup logging
 logging.basicConfig(
@@ -38,37 +76,71 @@ logging.basicConfig(
 )
 
 
-def cleanup_files():
-    if os.path.exists(THUMBNAIL_DIR):
-        shutil.rmtree(THUMBNAIL_DIR)
-    if os.path.exists("video.mp4"):
-        os.remove("video.mp4")
+processing_cache = None
+
+
+def get_cache():
+    global processing_cache
+    if processing_cache is None:
+        processing_cache = ProcessingCache(CACHE_DIR, CACHE_MAX_BYTES)
+    return processing_cache
+
+
+def artifact_params():
+    """The settings every cached artifact depends on; a change only invalidates that artifact."""
+    return {
+        "video_id": {},
+        "media": {},
+        "video_url": {},
+        "thumbnails": {"interval": THUMBNAIL_INTERVAL, "sizes": THUMBNAIL_SIZES, "mode": THUMBNAIL_MODE,
+                       "scene_threshold": SCENE_THRESHOLD, "dedup_distance": THUMBNAIL_DEDUP_DISTANCE,
+                       "poster": ENABLE_POSTER, "format": resolve_image_format(THUMBNAIL_FORMAT),
+                       "byte_budget": THUMBNAIL_BYTE_BUDGET, "profile": PERFORMANCE_PROFILE},
+        "sprites": {"enabled": ENABLE_SPRITES, "interval": THUMBNAIL_INTERVAL, "sizes": THUMBNAIL_SIZES,
+                    "columns": SPRITE_COLUMNS, "rows": SPRITE_ROWS, "profile": PERFORMANCE_PROFILE},
+        "previews": {"times": PREVIEW_TIMES, "mode": PREVIEW_MODE, "height": PREVIEW_HEIGHT,
+                     "video_bitrate": PREVIEW_VIDEO_BITRATE, "audio_bitrate": PREVIEW_AUDIO_BITRATE,
+                     "profile": PERFORMANCE_PROFILE},
+        "streaming": {"enabled": ENABLE_ABR_LADDER, "ladder": LADDER, "segment_duration": LADDER_SEGMENT_DURATION,
+                      "profile": PERFORMANCE_PROFILE}
+    }
+
+
+def create_work_dir(video_name):
+    if not os.path.exists(WORK_DIR):
+        os.makedirs(WORK_DIR)
+    return tempfile.mkdtemp(prefix=f"{video_name}_", dir=WORK_DIR)
+
+
+def cleanup_files(work_dir):
+    if os.path.exists(work_dir):
+        shutil.rmtree(work_dir)
 
 
-def download_video(video_url):
-    output_file = "video.mp4"
+def download_video(video_url, work_dir=".", public_only=False):
+    output_file = os.path.join(work_dir, "video.mp4")
     logging.info(f"Downloading video from {video_url}...")
-    subprocess.run(['ffmpeg', '-i', video_url, '-c', 'copy', output_file], check=True)
+    with tracing.stage("download"):
+        # Checked on the path, so signed manifest URLs with a query string are recognised too
+        if is_remote(video_url) and not urlparse(video_url).path.endswith(('.m3u8', '.mpd', '.hls', '.dash')):
+            downloader.download(video_url, output_file)
+        elif public_only:
+            # ffmpeg follows redirects and playlist entries on its own, past the address checks
+            raise downloader.DownloadError(f"Only direct http(s) video files are accepted: {video_url}")
+        else:
+            # Streaming manifests and non-HTTP inputs still need ffmpeg to assemble a single file
+            run_ffmpeg(FFmpegCommand().input(video_url).output(output_file, '-c', 'copy').build(), check=True)
     logging.info(f"Downloaded video to {output_file}.")
     return output_file
 
 
 def get_video_duration(video_file):
-    result = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of',
-                             'default=noprint_wrappers=1:nokey=1', video_file],
-                            stdout=subprocess.PIPE)
-    duration = float(result.stdout.decode().strip())
-    return duration
+    return probe(video_file).duration
 
 
 def get_video_dimensions(video_file):
-    result = subprocess.run(['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries',
-                             'stream=width,height', '-of', 'csv=s=x:p=0', video_file],
-                            stdout=subprocess.PIPE)
-    dimensions = result.stdout.decode().strip().split('x')
-    width = int(dimensions[0])
-    height = int(dimensions[1])
-    return width, height
+    media = probe(video_file)
+    return media.display_width, media.display_height
 
 
 def calculate_thumbnail_size(video_width, video_height, thumbnail_size):
@@ -80,114 +152,534 @@ def calculate_thumbnail_size(video_width, video_height, thumbnail_size):
         return (int(size * aspect_ratio), size)
 
 
-def upload_to_firebase(local_file_path, firebase_path):
-    bucket = storage.bucket()
-    blob = bucket.blob(firebase_path)
-    blob.upload_from_filename(local_file_path)
-    blob.make_public()
-    return blob.public_url
+def uploader():
+    return get_uploader(max_workers=UPLOAD_CONCURRENCY)
 
 
-def generate_thumbnails(video_file, video_name):
-    if not os.path.exists(THUMBNAIL_DIR):
-        os.makedirs(THUMBNAIL_DIR)
+def upload_to_firebase(local_file_path, firebase_path):
+    return uploader().upload(local_file_path, firebase_path)
+
+
+def build_thumbnail_filter(video_width, video_height, tile=None, command=None, frames=True):
+    """Build a filter graph that samples one frame per interval and fans it out to every size.
+
+    When ``tile`` is given as (columns, rows) every size is also packed into sprite sheets,
+    from the same scaled frames. Returns the graph, the per-frame output labels (unless
+    ``frames`` is False) and the sprite output labels. The scaler comes from the performance
+    profile of ``command``.
+    """
+    command = command or FFmpegCommand()
+    labels = [f"t{index}" for index in range(len(THUMBNAIL_SIZES))]
+    chains = [f"[0:v]fps=1/{THUMBNAIL_INTERVAL},split={len(labels)}" + "".join(f"[{label}]" for label in labels)]
+    outputs = {}
+    sprite_outputs = {}
+    for label, (size_name, base_size) in zip(labels, THUMBNAIL_SIZES.items()):
+        width, height = calculate_thumbnail_size(video_width, video_height, base_size)
+        scaled = f"[{label}]{command.scale(width, height)}"
+        tile_filter = f"tile={tile[0]}x{tile[1]}" if tile else ""
+        if frames and tile:
+            chains.append(f"{scaled},split=2[{size_name}][{size_name}_tiles]")
+            chains.append(f"[{size_name}_tiles]{tile_filter}[{size_name}_sprite]")
+        elif tile:
+            chains.append(f"{scaled},{tile_filter}[{size_name}_sprite]")
+        else:
+            chains.append(f"{scaled}[{size_name}]")
+        if frames:
+            outputs[size_name] = f"[{size_name}]"
+        if tile:
+            sprite_outputs[size_name] = f"[{size_name}_sprite]"
+    return ";".join(chains), outputs, sprite_outputs
+
+
+def sprite_sheet_count(duration):
+    frame_count = max(1, math.ceil(duration / THUMBNAIL_INTERVAL))
+    return math.ceil(frame_count / (SPRITE_COLUMNS * SPRITE_ROWS))
+
+
+def add_sprite_outputs(command, sprite_outputs, duration, output_dir):
+    for size_name, label in sprite_outputs.items():
+        command.image_output(os.path.join(output_dir, f"{size_name}_sprite_%d.{command.image_extension}"), label,
+                             frames=sprite_sheet_count(duration), start_number=0)
+
+
+def thumbnail_encoding(video_file, sizes, duration, output_dir):
+    """The image format for thumbnails and, with a byte budget, the encoder quality per size."""
+    image_format = resolve_image_format(THUMBNAIL_FORMAT)
+    if not THUMBNAIL_BYTE_BUDGET:
+        return image_format, {}
+    return image_format, choose_qualities(video_file, sizes, duration, image_format, THUMBNAIL_BYTE_BUDGET,
+                                          output_dir)
+
+
+def extract_thumbnails(video_file, duration, output_dir=THUMBNAIL_DIR, on_frame=None, sprites=False):
+    """Decode the video once and write the frames for all THUMBNAIL_SIZES in a single ffmpeg run.
+
+    Frames are written in THUMBNAIL_FORMAT, at the quality that fits THUMBNAIL_BYTE_BUDGET.
+    With sprites, the same run also writes the sprite sheets that generate_sprites publishes.
+    on_frame(size_name, timestamp, local_file) is called for every frame as soon as it is
+    written. Returns {size_name: [(timestamp, local_file), ...]} for every frame that was written.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
 
-    logging.info(f"Generating thumbnails for {video_file}...")
-    thumbnails = {"small": [], "medium": []}
     video_width, video_height = get_video_dimensions(video_file)
-    index = 0
+    sizes = {size_name: calculate_thumbnail_size(video_width, video_height, base_size)
+             for size_name, base_size in THUMBNAIL_SIZES.items()}
+    extension, qualities = thumbnail_encoding(video_file, sizes, duration, output_dir)
+    frame_count = max(1, math.ceil(duration / THUMBNAIL_INTERVAL))
+    command = FFmpegCommand().input(video_file, thumbnail_decode=True)
+    tile = (SPRITE_COLUMNS, SPRITE_ROWS) if sprites else None
+    filter_graph, outputs, sprite_outputs = build_thumbnail_filter(video_width, video_height, tile, command)
+    command.filter_complex(filter_graph)
+    for size_name, label in outputs.items():
+        command.image_output(os.path.join(output_dir, f"{size_name}_thumbnail_%d.{extension}"), label,
+                             frames=frame_count, start_number=0, image_format=extension,
+                             quality=qualities.get(size_name))
+    add_sprite_outputs(command, sprite_outputs, duration, output_dir)
+
+    frame_files = {
+        size_name: [os.path.join(output_dir, f"{size_name}_thumbnail_{index}.{extension}")
+                    for index in range(frame_count)]
+        for size_name in THUMBNAIL_SIZES
+    }
+    frames = {size_name: [] for size_name in THUMBNAIL_SIZES}
 
-    while True:
+    def collect(size_name, index, thumbnail_file):
         timestamp = index * THUMBNAIL_INTERVAL
-        processing_success = False
-
-        for size_name, base_size in THUMBNAIL_SIZES.items():
-            resolution = calculate_thumbnail_size(video_width, video_height, base_size)
-            thumbnail_file = os.path.join(THUMBNAIL_DIR, f"{size_name}_thumbnail_{timestamp}.jpg")
-            result = subprocess.run(
-                ['ffmpeg', '-i', video_file, '-ss', str(timestamp), '-vframes', '1', '-s',
-                 f"{resolution[0]}x{resolution[1]}", thumbnail_file],
-                stderr=subprocess.PIPE
-            )
-
-            if result.returncode != 0 or not os.path.exists(thumbnail_file):
-                logging.warning(f"Failed to generate {size_name} thumbnail at {timestamp}s.")
-                continue
+        frames[size_name].append((timestamp, thumbnail_file))
+        if on_frame:
+            on_frame(size_name, timestamp, thumbnail_file)
+
+    returncode, errors = run_ffmpeg_watching(command.build(), frame_files, collect)
+    if returncode != 0:
+        logging.warning(f"Thumbnail extraction failed: {errors}")
+
+    for size_name, size_frames in frames.items():
+        if len(size_frames) < frame_count:
+            written = {timestamp for timestamp, _ in size_frames}
+            for index in range(frame_count):
+                if index * THUMBNAIL_INTERVAL not in written:
+                    logging.warning(f"Failed to generate {size_name} thumbnail at {index * THUMBNAIL_INTERVAL}s.")
+    return frames
+
+
+def thumbnail_entry(thumbnail_url, time, thumbnail_file):
+    """A thumbnails[size] entry, with the format and byte size of the published file."""
+    return {
+        "thumbnailUrl": thumbnail_url,
+        "time": time,
+        "format": os.path.splitext(thumbnail_file)[1].lstrip("."),
+        "bytes": os.path.getsize(thumbnail_file)
+    }
 
-            processing_success = True
-            firebase_path = f"thumbnails/{video_name}/{size_name}/thumbnail_{timestamp}.jpg"
-            thumbnail_url = upload_to_firebase(thumbnail_file, firebase_path)
-            thumbnails[size_name].append({
-                "thumbnailUrl": thumbnail_url,
-                "time": timestamp
-            })
 
-        if not processing_success:
-            logging.info(f"No more thumbnails generated after {timestamp}s.")
-            break
+def generate_smart_thumbnails(video_file, video_name, duration, output_dir=THUMBNAIL_DIR):
+    """Thumbnails at keyframes or scene changes, without near-duplicates; the poster frame is flagged."""
+    video_width, video_height = get_video_dimensions(video_file)
+    sizes = {size_name: calculate_thumbnail_size(video_width, video_height, base_size)
+             for size_name, base_size in THUMBNAIL_SIZES.items()}
+    image_format, qualities = thumbnail_encoding(video_file, sizes, duration, output_dir)
+    frames = select_frames(video_file, sizes, output_dir, mode=THUMBNAIL_MODE, scene_threshold=SCENE_THRESHOLD,
+                           max_distance=THUMBNAIL_DEDUP_DISTANCE, poster=ENABLE_POSTER, image_format=image_format,
+                           qualities=qualities)
+
+    thumbnails = {size_name: [] for size_name in THUMBNAIL_SIZES}
+    uploads = []
+    for frame in frames:
+        for size_name, thumbnail_file in frame["files"].items():
+            extension = os.path.splitext(thumbnail_file)[1]
+            firebase_path = f"thumbnails/{video_name}/{size_name}/thumbnail_{frame['time']}{extension}"
+            uploads.append((size_name, frame, thumbnail_file, uploader().submit(thumbnail_file, firebase_path)))
+
+    for size_name, frame, thumbnail_file, future in uploads:
+        try:
+            thumbnail_url = future.result()
+        except Exception as e:
+            logging.warning(f"Failed to upload {size_name} thumbnail at {frame['time']}s: {e}")
+            continue
+        thumbnail = thumbnail_entry(thumbnail_url, frame["time"], thumbnail_file)
+        if frame["poster"]:
+            thumbnail["poster"] = True
+        thumbnails[size_name].append(thumbnail)
 
-        index += 1
+    logging.info(f"Generated {len(frames)} {THUMBNAIL_MODE} thumbnails per size.")
+    return thumbnails
+
+
+def generate_thumbnails(video_file, video_name, duration, output_dir=THUMBNAIL_DIR, sprites=False):
+    """Extract and upload the thumbnails; with sprites, the interval mode writes the sprite sheets in the same pass."""
+    logging.info(f"Generating thumbnails for {video_file}...")
+    if THUMBNAIL_MODE != "interval":
+        return generate_smart_thumbnails(video_file, video_name, duration, output_dir)
+    uploads = {size_name: [] for size_name in THUMBNAIL_SIZES}
+
+    # Frames are uploaded while ffmpeg keeps extracting the next ones
+    def upload_frame(size_name, timestamp, thumbnail_file):
+        extension = os.path.splitext(thumbnail_file)[1]
+        firebase_path = f"thumbnails/{video_name}/{size_name}/thumbnail_{timestamp}{extension}"
+        uploads[size_name].append((timestamp, thumbnail_file, uploader().submit(thumbnail_file, firebase_path)))
+
+    extract_thumbnails(video_file, duration, output_dir, on_frame=upload_frame, sprites=sprites)
+
+    thumbnails = {size_name: [] for size_name in THUMBNAIL_SIZES}
+    for size_name, size_uploads in uploads.items():
+        for timestamp, thumbnail_file, future in size_uploads:
+            try:
+                thumbnail_url = future.result()
+            except Exception as e:
+                logging.warning(f"Failed to upload {size_name} thumbnail at {timestamp}s: {e}")
+                continue
+            thumbnails[size_name].append(thumbnail_entry(thumbnail_url, timestamp, thumbnail_file))
 
-    logging.info(f"Generated thumbnails for timestamps up to {index * THUMBNAIL_INTERVAL} seconds.")
+    logging.info(f"Generated {sum(len(items) for items in thumbnails.values())} thumbnails "
+                 f"for timestamps up to {math.ceil(duration / THUMBNAIL_INTERVAL) * THUMBNAIL_INTERVAL} seconds.")
     return thumbnails
 
 
-def generate_preview_clips(video_file, video_name):
-    previews = []
-    logging.info(f"Generating preview clips for {video_file}...")
-    for start_time, end_time in PREVIEW_TIMES:
-        preview_file = f"preview_{start_time}_{end_time}.mp4"
-        result = subprocess.run(
-            ['ffmpeg', '-i', video_file, '-ss', str(start_time), '-to', str(end_time), '-c', 'copy', preview_file],
-            stderr=subprocess.PIPE
-        )
+def format_vtt_timestamp(seconds):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def build_sprite_index(sheet_urls, frame_count, duration, tile_width, tile_height):
+    """Map every thumbnail time to its sprite sheet URL and #xywh rectangle."""
+    per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+    index = []
+    for frame in range(frame_count):
+        sheet, position = divmod(frame, per_sheet)
+        x = (position % SPRITE_COLUMNS) * tile_width
+        y = (position // SPRITE_COLUMNS) * tile_height
+        index.append({
+            "time": frame * THUMBNAIL_INTERVAL,
+            "end_time": min((frame + 1) * THUMBNAIL_INTERVAL, duration),
+            "url": f"{sheet_urls[sheet]}#xywh={x},{y},{tile_width},{tile_height}"
+        })
+    return index
+
+
+def build_webvtt(index):
+    lines = ["WEBVTT", ""]
+    for cue in index:
+        lines.append(f"{format_vtt_timestamp(cue['time'])} --> {format_vtt_timestamp(cue['end_time'])}")
+        lines.append(cue["url"])
+        lines.append("")
+    return "\n".join(lines)
+
 
-        if result.returncode != 0 or not os.path.exists(preview_file):
-            logging.warning(f"Failed to generate preview clip from {start_time}s to {end_time}s.")
+def generate_sprites(video_file, video_name, duration, output_dir=THUMBNAIL_DIR):
+    """Tile SPRITE_COLUMNS x SPRITE_ROWS thumbnails per image for every size, with a WebVTT index.
+
+    Sheets already written by the thumbnail pass are published as they are; a separate
+    decode only runs when they are missing (cached thumbnails, keyframe or scene mode).
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    video_width, video_height = get_video_dimensions(video_file)
+    frame_count = max(1, math.ceil(duration / THUMBNAIL_INTERVAL))
+    sheet_count = sprite_sheet_count(duration)
+    extension = FFmpegCommand().image_extension
+    written = all(os.path.exists(os.path.join(output_dir, f"{size_name}_sprite_0.{extension}"))
+                  for size_name in THUMBNAIL_SIZES)
+    if not written:
+        logging.info(f"Generating sprite sheets for {video_file}...")
+        command = FFmpegCommand().input(video_file, thumbnail_decode=True)
+        filter_graph, _, sprite_outputs = build_thumbnail_filter(video_width, video_height,
+                                                                 (SPRITE_COLUMNS, SPRITE_ROWS), command, frames=False)
+        command.filter_complex(filter_graph)
+        add_sprite_outputs(command, sprite_outputs, duration, output_dir)
+
+        result = run_ffmpeg(command.build(), stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            logging.warning(f"Sprite generation failed: {result.stderr.decode(errors='replace').strip()}")
+            return {}
+
+    sprites = {}
+    for size_name, base_size in THUMBNAIL_SIZES.items():
+        tile_width, tile_height = calculate_thumbnail_size(video_width, video_height, base_size)
+        sprite_files = [os.path.join(output_dir, f"{size_name}_sprite_{sheet}.{extension}")
+                        for sheet in range(sheet_count)]
+        missing = [sprite_file for sprite_file in sprite_files if not os.path.exists(sprite_file)]
+        if missing:
+            logging.warning(f"Expected {sheet_count} {size_name} sprite sheets, got {sheet_count - len(missing)}.")
             continue
 
-        firebase_path = f"previews/{video_name}/{preview_file}"
-        preview_url = upload_to_firebase(preview_file, firebase_path)
+        sheet_urls = uploader().upload_many(
+            (sprite_file, f"thumbnails/{video_name}/{size_name}/sprite_{sheet}.{extension}")
+            for sheet, sprite_file in enumerate(sprite_files)
+        )
+
+        index = build_sprite_index(sheet_urls, frame_count, duration, tile_width, tile_height)
+        vtt_file = os.path.join(output_dir, f"{size_name}_sprites.vtt")
+        with open(vtt_file, 'w') as f:
+            f.write(build_webvtt(index))
+
+        sprites[size_name] = {
+            "vtt_url": upload_to_firebase(vtt_file, f"thumbnails/{video_name}/{size_name}/sprites.vtt"),
+            "columns": SPRITE_COLUMNS,
+            "rows": SPRITE_ROWS,
+            "tile_width": tile_width,
+            "tile_height": tile_height,
+            "sheets": sheet_urls,
+            "index": index
+        }
+
+    logging.info(f"Generated {sheet_count} sprite sheets per size.")
+    return sprites
+
+
+def generate_preview_clips(video_file, video_name, duration, has_audio=True, output_dir="."):
+    logging.info(f"Generating preview clips for {video_file}...")
+    clips = create_previews(video_file, PREVIEW_TIMES, duration, output_dir, mode=PREVIEW_MODE, has_audio=has_audio,
+                            height=PREVIEW_HEIGHT, video_bitrate=PREVIEW_VIDEO_BITRATE,
+                            audio_bitrate=PREVIEW_AUDIO_BITRATE)
+
+    previews = []
+    for clip in clips:
+        preview_name = f"preview_{clip['start_time']}_{clip['end_time']}.mp4"
+        firebase_path = f"previews/{video_name}/{preview_name}"
         previews.append({
-            "url": preview_url,
-            "start_time": start_time * 1000,  # Convert to milliseconds
-            "end_time": end_time * 1000
+            "url": uploader().submit(clip["file"], firebase_path),
+            "start_time": int(clip["start_time"] * 1000),  # Convert to milliseconds
+            "end_time": int(clip["end_time"] * 1000),
+            # Where the clip really starts and ends; stream copy cuts on keyframes
+            "cut_start_time": int(clip["cut_start"] * 1000),
+            "cut_end_time": int(clip["cut_end"] * 1000)
         })
 
+    for preview in previews:
+        preview["url"] = preview["url"].result()
+
     logging.info(f"Generated {len(previews)} preview clips.")
     return previews
 
 
-def process_video(video_info):
-    cleanup_files()
-    video_file = download_video(video_info['url'])
-    video_name = os.path.splitext(os.path.basename(video_info['url']))[0]
+def generate_streaming(video_file, video_name, media, work_dir):
+    """Transcode the rendition ladder that fits the source and publish it as HLS."""
+    renditions = select_renditions(media["display_width"], media["display_height"])
+    logging.info(f"Packaging {len(renditions)} HLS renditions for {video_file}...")
+    output_dir = os.path.join(work_dir, "hls")
+    packaged = package_hls(video_file, output_dir, renditions, media["duration"], fps=media["fps"] or 30,
+                           has_audio=bool(media["audio_streams"]), segment_duration=LADDER_SEGMENT_DURATION)
+    if not packaged:
+        return {}
+
+    remote_dir = f"streams/{video_name}"
+    files = [
+        (os.path.join(root, name), f"{remote_dir}/{os.path.relpath(os.path.join(root, name), output_dir)}")
+        for root, _, names in os.walk(output_dir) for name in names
+    ]
+    uploader().upload_many(files)
+
+    return {
+        "format": "hls",
+        "manifest_url": uploader().public_url(f"{remote_dir}/master.m3u8"),
+        "renditions": [
+            {
+                "width": rendition["width"],
+                "height": rendition["height"],
+                "bitrate": f"{rendition['video_bitrate']}kbps",
+                "actual_bitrate": f"{rendition['actual_bitrate']}kbps",
+                "bytes": rendition["bytes"],
+                "playlist_url": uploader().public_url(f"{remote_dir}/{rendition['playlist']}")
+            }
+            for rendition in packaged
+        ]
+    }
 
-    duration = get_video_duration(video_file)
-    if duration < 10:
-        logging.info(f"Skipping thumbnail generation for {video_file}. Duration is less than 10 seconds.")
-        return None
 
-    thumbnails = generate_thumbnails(video_file, video_name)
-    previews = generate_preview_clips(video_file, video_name) if video_info['url'].endswith(('.hls', '.dash')) else []
+def process_video(video_info, on_stage=None, public_only=False, stored_artifacts=None):
+    """Process one video and return its metadata, or None when it is too short.
 
-    video_metadata = {
+    on_stage(name, status, error, artifact) is called as each artifact is looked up and
+    built, with status "cached", "running", "completed" or "failed". A completed stage
+    passes its artifact as {"params": ..., "value": ...}; given back in stored_artifacts
+    ({name: artifact}), stages whose settings haven't changed are not built again. Every
+    stage is traced to tracing.METRICS_FILE. With public_only, for urls submitted through the API, the source
+    is only fetched through the downloader's session, which refuses non-public addresses:
+    it is downloaded instead of streamed, and streaming manifests are refused.
+    """
+    with tracing.trace("video", url=video_info['url']):
+        return run_process_video(video_info, on_stage, public_only, stored_artifacts)
+
+
+def run_process_video(video_info, on_stage=None, public_only=False, stored_artifacts=None):
+    video_name = os.path.splitext(os.path.basename(video_info['url']))[0]
+    params = artifact_params()
+    cache = get_cache() if ENABLE_CACHE else None
+    source = cache.fingerprint(video_info['url']) if cache else None
+    artifacts = cache.load(source, params) if source else {}
+    # Stages an earlier attempt completed, e.g. on another node or without the cache
+    for name, artifact in (stored_artifacts or {}).items():
+        if name in params and artifact.get("params") == params_hash(params[name]):
+            artifacts.setdefault(name, artifact["value"])
+    if artifacts.keys() == params.keys():
+        logging.info(f"Cache hit for {video_info['url']}, skipping processing.")
+        return build_video_metadata(video_info, artifacts)
+
+    work_dir = create_work_dir(video_name)
+    try:
+        # Pinned, so another worker's eviction can't delete the cached source while it is read
+        with cache.pinned(source) if cache and source else nullcontext():
+            return process_video_in(video_info, video_name, work_dir, cache, source, artifacts, on_stage, public_only)
+    finally:
+        cleanup_files(work_dir)
+
+
+def build_video_metadata(video_info, artifacts):
+    media = artifacts["media"]
+    bitrate = media["bitrate"] / 1000 or video_info.get('bitrate', 0)
+    return {
         "status": "success",
-        "video_id": str(uuid.uuid4()),  # Generate a unique video ID
+        "video_id": artifacts["video_id"],
         "processing_status": "completed",
-        "video_url": upload_to_firebase(video_file, f"videos/{video_name}.mp4"),
+        "video_url": artifacts["video_url"],
         "metadata": {
-            "duration": int(duration * 1000),  # Convert to milliseconds
-            "width": video_info['width'],
-            "height": video_info['height'],
-            "bitrate": f"{int(video_info['bitrate'])}kbps",
-            "codec": "H.264"
+            "duration": int(media["duration"] * 1000),  # Convert to milliseconds
+            "width": float(media["display_width"]),
+            "height": float(media["display_height"]),
+            "bitrate": f"{int(bitrate)}kbps",
+            "codec": codec_display_name(media["codec"])
+        },
+        "thumbnails": artifacts["thumbnails"],
+        "poster": {
+            size_name: thumbnail["thumbnailUrl"]
+            for size_name, size_thumbnails in artifacts["thumbnails"].items()
+            for thumbnail in size_thumbnails if thumbnail.get("poster")
         },
-        "thumbnails": thumbnails,
-        "previews": previews
+        "sprites": artifacts["sprites"],
+        "previews": artifacts["previews"],
+        "streaming": artifacts["streaming"]
     }
 
-    return video_metadata
+
+def submit_source_upload(video_url, video_file, video_name, work_dir):
+    """Start publishing the source video and return a Future for its URL.
+
+    Sources already in our storage are never transferred: they are used as they are, or
+    copied server-side when they live under a different path. Other sources are only
+    uploaded when the target does not already hold the same content (MD5/CRC32C). When
+    the source is being streamed, the local copy is only made here, because it has to be
+    uploaded.
+    """
+    storage = uploader().storage
+    remote_path = f"videos/{video_name}.mp4"
+    source_path = storage.path_from_url(video_url)
+    if source_path == remote_path:
+        future = Future()
+        future.set_result(video_url)
+        return future
+    if source_path is not None:
+        return tracing.submit(uploader().executor, storage.copy_deduplicated, source_path, remote_path)
+
+    if is_remote(video_file):
+        def download_and_upload():
+            return uploader().upload_with_retry(download_video(video_url, work_dir), remote_path, deduplicate=True)
+
+        return tracing.submit(uploader().executor, download_and_upload)
+    return uploader().submit(video_file, remote_path, deduplicate=True)
+
+
+def process_video_in(video_info, video_name, work_dir, cache=None, source=None, artifacts=None, on_stage=None,
+                     public_only=False):
+    artifacts = dict(artifacts or {})
+    params = artifact_params()
+
+    def report(name, status, error=None, artifact=None):
+        if on_stage:
+            on_stage(name, status, error, artifact)
+
+    def produce(name, build):
+        # Only artifacts missing from the cache are built, and each is stored as soon as it exists
+        if name in artifacts:
+            report(name, "cached")
+            return artifacts[name]
+
+        report(name, "running")
+        try:
+            with tracing.stage(name):
+                artifacts[name] = build()
+        except Exception as e:
+            report(name, "failed", str(e))
+            raise
+        if cache and source:
+            cache.save(source, name, params[name], artifacts[name])
+        report(name, "completed", artifact={"params": params_hash(params[name]), "value": artifacts[name]})
+        return artifacts[name]
+
+    video_file = cache.get_intermediate(source) if cache and source else None
+    if video_file is None and STREAM_REMOTE_INPUTS and not public_only and is_remote(video_info['url']):
+        # ffprobe and ffmpeg read the URL directly, seeking with range requests
+        video_file = video_info['url']
+    if video_file is None:
+        video_file = download_video(video_info['url'], work_dir, public_only)
+        if cache and not source:
+            # The server gave nothing to identify the source by, so fall back to its content
+            source = file_fingerprint(video_file)
+            artifacts = dict(cache.load(source, params), **artifacts)
+    thumbnail_dir = os.path.join(work_dir, "thumbnails")
+
+    # One ffprobe run per source; every later lookup is served from the probe cache
+    media = produce("media", lambda: probe(video_file).to_dict())
+    duration = media["duration"]
+    if duration < 10:
+        logging.info(f"Skipping thumbnail generation for {video_file}. Duration is less than 10 seconds.")
+        return None
+
+    # The source upload runs in the background while thumbnails and previews are generated
+    video_upload = None
+    if "video_url" not in artifacts:
+        video_upload = submit_source_upload(video_info['url'], video_file, video_name, work_dir)
+
+    produce("video_id", lambda: str(uuid.uuid4()))  # Generate a unique video ID
+    # Sprite sheets come out of the thumbnail decode unless they are already cached
+    sprites_in_pass = ENABLE_SPRITES and "sprites" not in artifacts
+    produce("thumbnails", lambda: generate_thumbnails(video_file, video_name, duration, thumbnail_dir,
+                                                      sprites=sprites_in_pass))
+    produce("sprites", lambda: generate_sprites(video_file, video_name, duration, thumbnail_dir)
+            if ENABLE_SPRITES else {})
+    produce("previews", lambda: generate_preview_clips(video_file, video_name, duration,
+                                                       bool(media["audio_streams"]), work_dir))
+    produce("video_url", lambda: video_upload.result())
+    produce("streaming", lambda: generate_streaming(video_file, video_name, media, work_dir)
+            if ENABLE_ABR_LADDER else {})
+
+    local_copy = os.path.join(work_dir, "video.mp4")
+    if cache and source and os.path.exists(local_copy):
+        cache.put_intermediate(source, local_copy)
+
+    return build_video_metadata(video_info, artifacts)
+
+
+def process_videos(videos, output_file=OUTPUT_FILE, max_workers=MAX_WORKERS, max_encodes=MAX_CONCURRENT_ENCODES):
+    """Process videos concurrently and stream each result into output_file as soon as it completes."""
+    completed = 0
+    slots = BoundedSemaphore(max_encodes)
+    with open(output_file, 'w') as f, \
+            ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(slots,)) as executor:
+        f.write("[")
+        futures = {executor.submit(process_video, video): video['url'] for video in videos}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Failed to process {futures[future]}: {e}")
+                continue
+
+            if result is None:
+                continue
+
+            f.write(",\n" if completed else "\n")
+            f.write(json.dumps(result, indent=4))
+            f.flush()
+            completed += 1
+        f.write("\n]\n")
+
+    logging.info(f"Processed {completed}/{len(videos)} videos.")
+    return completed
 
 
 if __name__ == "__main__":
@@ -200,14 +692,6 @@ if __name__ == "__main__":
         }
     ]
 
-    results = []
-    for video in videos:
-        result = process_video(video)
-        if result is not None:
-            results.append(result)
-
-    # Save the results to a .json file
-    with open(OUTPUT_FILE, 'w') as f:
-        json.dump(results, f, indent=4)
+    process_videos(videos)
 
     logging.info(f"Processing completed. Results saved to {OUTPUT_FILE}")
@@ -1,9 +1,17 @@
 import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-import ffmpeg
+from application.video.probe import probe
+
+MAX_WORKERS = 16  # Concurrent ffprobe runs
+PROBE_TIMEOUT = 30  # Seconds allowed per URL
 
 
 class MediaInfo:
+    # Slots keep each record small, as batches hold tens of thousands of them
+    __slots__ = ("url", "bitrate", "width", "height")
+
     def __init__(self, url, bitrate, width, height):
         self.url = url
         self.bitrate = bitrate
@@ -19,15 +27,14 @@ class MediaInfo:
         }
 
 
-def get_video_info_from_url(url):
+def get_video_info_from_url(url, timeout=None):
     """Get video information (bitrate, width, height) from a video URL."""
     try:
-        probe = ffmpeg.probe(url)
-        video_stream = next(stream for stream in probe['streams'] if stream['codec_type'] == 'video')
+        media = probe(url, timeout=timeout)
 
-        width = float(video_stream['width'])
-        height = float(video_stream['height'])
-        bitrate = float(video_stream.get('bit_rate', 0)) / 1000  # Convert bitrate to kbps
+        width = float(media.display_width)
+        height = float(media.display_height)
+        bitrate = media.bitrate / 1000  # Convert bitrate to kbps
 
         return MediaInfo(url, bitrate, width, height)
     except Exception as e:
@@ -35,22 +42,84 @@ def get_video_info_from_url(url):
         return None
 
 
-def generate_json_list(url_list):
-    media_info_list = []
+def iter_media_info(url_list, max_workers=MAX_WORKERS, timeout=PROBE_TIMEOUT):
+    """Probe URLs with bounded concurrency and yield each MediaInfo as soon as it is ready.
+
+    At most 2 * max_workers probes are queued at a time, so very long URL lists are not
+    turned into futures all at once.
+    """
+    urls = iter(url_list)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        while True:
+            for url in urls:
+                pending.add(executor.submit(get_video_info_from_url, url, timeout))
+                if len(pending) >= 2 * max_workers:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                info = future.result()
+                if info:
+                    yield info
 
-    for url in url_list:
-        info = get_video_info_from_url(url)
-        if info:
-            media_info_list.append(info.to_dict())
+
+def generate_json_list(url_list, max_workers=MAX_WORKERS, timeout=PROBE_TIMEOUT):
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        infos = executor.map(lambda url: get_video_info_from_url(url, timeout), url_list)
+        media_info_list = [info.to_dict() for info in infos if info]
 
     json_list = json.dumps(media_info_list, indent=4)
     return json_list
 
 
+def read_completed_urls(output_file):
+    """Return the URLs already in an NDJSON output file, dropping a partially written last line."""
+    if not os.path.exists(output_file):
+        return set()
+
+    completed = set()
+    valid_size = 0
+    with open(output_file, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                completed.add(json.loads(line)["url"])
+            except (ValueError, KeyError):
+                break
+            valid_size += len(line)
+
+    if valid_size != os.path.getsize(output_file):
+        with open(output_file, 'r+b') as f:
+            f.truncate(valid_size)
+    return completed
+
+
+def generate_ndjson(url_list, output_file, max_workers=MAX_WORKERS, timeout=PROBE_TIMEOUT, resume=True):
+    """Probe URLs concurrently and append one JSON line per video to output_file as each completes.
+
+    With resume, URLs already present in output_file are skipped, so an interrupted run
+    can be restarted with the same arguments.
+    """
+    completed = read_completed_urls(output_file) if resume else set()
+    remaining = (url for url in url_list if url not in completed)
+
+    count = 0
+    with open(output_file, 'a' if resume else 'w') as f:
+        for info in iter_media_info(remaining, max_workers, timeout):
+            f.write(json.dumps(info.to_dict()) + "\n")
+            f.flush()
+            count += 1
+    return count
+
+
 # Example usage
-url_list = [
-    "https://storage.googleapis.com/smoothscroll-7252a.appspot.com/videos/1_20240812063339_5927708-hd_1080_1920_30fps.mp4"
-]
+if __name__ == "__main__":
+    url_list = [
+        "https://storage.googleapis.com/smoothscroll-7252a.appspot.com/videos/1_20240812063339_5927708-hd_1080_1920_30fps.mp4"
+    ]
 
-json_data = generate_json_list(url_list)
-print(json_data)
+    json_data = generate_json_list(url_list)
+    print(json_data)
@@ -0,0 +1,125 @@
+import logging
+import os
+import re
+import subprocess
+
+from application.video.command_builder import FFmpegCommand
+from application.video.ffmpeg_runner import run_ffmpeg
+
+HASH_WIDTH = 9  # dHash compares horizontal neighbours: 9x8 grey pixels give a 64-bit hash
+HASH_HEIGHT = 8
+SHOWINFO_TIME = re.compile(r"Parsed_showinfo.*\bpts_time:\s*(-?[\d.]+)")
+
+
+def build_frame_filter(mode, sizes, scene_threshold=0.3, command=None):
+    """Filter graph that picks candidate frames and fans them out to every size plus a tiny grey copy for hashing.
+
+    showinfo logs the timestamp of every picked frame, in output order.
+    """
+    command = command or FFmpegCommand()
+    if mode == "scene":
+        # The first frame has no scene score, so it is always taken
+        picker = f"select='eq(n,0)+gt(scene,{scene_threshold})',showinfo"
+    else:
+        picker = "showinfo"  # Keyframe mode: the decoder already skips everything else
+    labels = [f"s{index}" for index in range(len(sizes))] + ["h"]
+    chains = [f"[0:v]{picker},split={len(labels)}" + "".join(f"[{label}]" for label in labels)]
+    outputs = {}
+    for label, (size_name, (width, height)) in zip(labels, sizes.items()):
+        chains.append(f"[{label}]{command.scale(width, height)}[{size_name}]")
+        outputs[size_name] = f"[{size_name}]"
+    chains.append(f"[h]scale={HASH_WIDTH}:{HASH_HEIGHT}:flags=area,format=gray[hash]")
+    return ";".join(chains), outputs
+
+
+def parse_frame_times(stderr):
+    return [float(match.group(1)) for match in map(SHOWINFO_TIME.search, stderr.splitlines()) if match]
+
+
+def dhash(gray):
+    """64-bit difference hash of a 9x8 grey frame: one bit per pixel brighter than its right neighbour."""
+    value = 0
+    for row in range(HASH_HEIGHT):
+        offset = row * HASH_WIDTH
+        for column in range(HASH_WIDTH - 1):
+            value = (value << 1) | (gray[offset + column] > gray[offset + column + 1])
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def contrast(gray):
+    mean = sum(gray) / len(gray)
+    return sum((pixel - mean) ** 2 for pixel in gray) / len(gray)
+
+
+def extract_frames(video_file, sizes, output_dir, mode="keyframe", scene_threshold=0.3, image_format=None,
+                   qualities=None):
+    """Decode once and write the keyframes or scene-change frames for every size.
+
+    sizes maps size names to (width, height) and qualities optionally size names to encoder
+    qualities. Returns a list of dicts with the frame time, its file per size and its 9x8 grey pixels.
+    """
+    qualities = qualities or {}
+    os.makedirs(output_dir, exist_ok=True)
+    # showinfo logs at the info level
+    command = FFmpegCommand(loglevel="info").input(video_file, keyframes_only=mode == "keyframe",
+                                                   thumbnail_decode=True)
+    filter_graph, outputs = build_frame_filter(mode, sizes, scene_threshold, command)
+    command.filter_complex(filter_graph).option('-vsync', 'passthrough')
+    extension = image_format or command.image_extension
+    for size_name, label in outputs.items():
+        command.image_output(os.path.join(output_dir, f"{size_name}_frame_%d.{extension}"), label, start_number=0,
+                             image_format=extension, quality=qualities.get(size_name))
+    command.output('pipe:1', '-map', '[hash]', '-f', 'rawvideo', '-pix_fmt', 'gray')
+
+    result = run_ffmpeg(command.build(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr = result.stderr.decode(errors='replace')
+    if result.returncode != 0:
+        logging.warning(f"Frame extraction failed: {(stderr.strip().splitlines() or [''])[-1]}")
+
+    frame_size = HASH_WIDTH * HASH_HEIGHT
+    times = parse_frame_times(stderr)
+    count = min(len(times), len(result.stdout) // frame_size)
+    frames = []
+    for index in range(count):
+        files = {size_name: os.path.join(output_dir, f"{size_name}_frame_{index}.{extension}") for size_name in sizes}
+        if not all(os.path.exists(path) for path in files.values()):
+            continue
+        frames.append({
+            "time": round(times[index], 3),
+            "files": files,
+            "gray": result.stdout[index * frame_size:(index + 1) * frame_size]
+        })
+    return frames
+
+
+def deduplicate(frames, max_distance=6):
+    """Drop frames whose dHash is within max_distance bits of a frame already kept."""
+    kept = []
+    for frame in frames:
+        frame["hash"] = dhash(frame["gray"])
+        if all(hamming(frame["hash"], other["hash"]) > max_distance for other in kept):
+            kept.append(frame)
+    return kept
+
+
+def pick_poster(frames):
+    """The frame with the most contrast, which skips black, faded and flat frames."""
+    if not frames:
+        return None
+    return max(frames, key=lambda frame: contrast(frame["gray"]))
+
+
+def select_frames(video_file, sizes, output_dir, mode="keyframe", scene_threshold=0.3, max_distance=6,
+                  poster=True, image_format=None, qualities=None):
+    """Extract candidate frames, drop near-duplicates and, with poster, mark one as the poster."""
+    frames = extract_frames(video_file, sizes, output_dir, mode, scene_threshold, image_format, qualities)
+    kept = deduplicate(frames, max_distance)
+    poster = pick_poster(kept) if poster else None
+    for frame in kept:
+        frame["poster"] = frame is poster
+    logging.info(f"Kept {len(kept)} of {len(frames)} {mode} frames after deduplication.")
+    return kept
@@ -1,73 +1,131 @@
+import base64
 import os
-import requests
-from google.cloud import storage
-from google.oauth2 import service_account
-from datetime import datetime
-# Path to your Firebase service account key JSON file
-SERVICE_ACCOUNT_KEY_PATH = "../../firebase-service-account-key.json"
+from concurrent.futures import Future
 
-# Firebase Storage bucket name
-FIREBASE_STORAGE_BUCKET_NAME = "CHANGE YOUR STORAGE BUCKET HERE"
+from application import tracing
+from application.storage import file_hashes, get_storage
+from application.video import downloader
+from application.uploader import Uploader
 
-def initialize_firebase():
-    credentials = service_account.Credentials.from_service_account_file(SERVICE_ACCOUNT_KEY_PATH)
-    client = storage.Client(credentials=credentials, project=credentials.project_id)
-    return client.bucket(FIREBASE_STORAGE_BUCKET_NAME)
+# The storage backend and Firebase bucket come from Config (STORAGE_BACKEND, FIREBASE_STORAGE_BUCKET_NAME)
+
+def print_progress(done, total):
+    if total:
+        print(f"\r  {done * 100 // total}% of {total // (1024 * 1024)} MB", end="", flush=True)
 
 def download_video(url, output_path):
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()  # Ensure we notice bad responses
-        with open(output_path, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-    except requests.exceptions.HTTPError as err:
+        # Pooled session, parallel Range segments, resume and size/MD5 verification
+        with tracing.stage("download", source=url):
+            downloader.download(url, output_path, progress=print_progress)
+        print()
+    except Exception as err:
         print(f"Failed to download {url}: {err}")
         return False
     return True
 
-def file_exists(bucket, remote_file_name):
-    blob = bucket.blob(remote_file_name)
-    return blob.exists()
+def file_exists(storage, remote_file_name):
+    return storage.exists(remote_file_name)
+
+def content_addressed_file_name(md5_hex):
+    # Named after the content alone, so the same bytes published under any URL are stored once
+    return f"videos/{md5_hex}.mp4"
 
-def generate_timestamped_file_name(url, index):
-    # Generate a timestamped file name based on the current time
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    base_name = os.path.basename(url)
-    return f"videos/{index}_{timestamp}_{base_name}"
+def generate_content_addressed_file_name(local_file_path):
+    return content_addressed_file_name(base64.b64decode(file_hashes(local_file_path)['md5']).hex())
+
+def remote_md5(url):
+    """Hex MD5 the server reports for url (Content-MD5 or x-goog-hash), or None."""
+    try:
+        head = downloader.get_session().head(url, allow_redirects=True, timeout=downloader.TIMEOUT)
+        head.raise_for_status()
+    except Exception as err:
+        print(f"Could not check {url} before downloading: {err}")
+        return None
+    md5 = downloader.expected_md5_from_headers(head.headers)
+    if not md5:
+        return None
+    if len(md5) == 32:
+        return md5.lower()
+    try:
+        return base64.b64decode(md5).hex()
+    except ValueError:
+        return None
 
-def upload_video_to_firebase(bucket, local_file_path, remote_file_name):
-    if file_exists(bucket, remote_file_name):
+def upload_video_to_firebase(storage, local_file_path, remote_file_name, uploader=None):
+    if file_exists(storage, remote_file_name):
         print(f"File already exists: {remote_file_name}")
-        return bucket.blob(remote_file_name).public_url
+        return storage.public_url(remote_file_name)
+
+    if uploader is not None:
+        return uploader.upload_with_retry(local_file_path, remote_file_name)
 
-    blob = bucket.blob(remote_file_name)
-    blob.upload_from_filename(local_file_path)
-    blob.make_public()
-    return blob.public_url
+    return storage.put(local_file_path, remote_file_name)
 
-def process_videos(url_list):
-    bucket = initialize_firebase()
-    uploaded_urls = []
+def upload_and_remove(storage, uploader, local_file_name, remote_file_name):
+    try:
+        return upload_video_to_firebase(storage, local_file_name, remote_file_name, uploader)
+    finally:
+        os.remove(local_file_name)
+
+def process_videos(url_list, upload_concurrency=4):
+    with tracing.trace("upload_videos", urls=len(url_list)):
+        return run_process_videos(url_list, upload_concurrency)
+
+def run_process_videos(url_list, upload_concurrency=4):
+    storage = get_storage()
+    uploader = Uploader(storage, max_workers=upload_concurrency)
+    uploads = []
+    seen = {}
 
     for idx, video_url in enumerate(url_list):
         print(f"Processing video {idx + 1}/{len(url_list)}: {video_url}")
 
+        # Videos already in our storage don't need to be downloaded or uploaded again
+        if storage.path_from_url(video_url) is not None:
+            print(f"Already in storage: {video_url}")
+            existing = Future()
+            existing.set_result(video_url)
+            uploads.append(existing)
+            continue
+
+        # When the server reports the content hash, known videos are skipped without downloading them
+        md5_hex = remote_md5(video_url)
+        if md5_hex:
+            remote_file_name = content_addressed_file_name(md5_hex)
+            if remote_file_name in seen:
+                print(f"Duplicate of an earlier video: {video_url}")
+                uploads.append(seen[remote_file_name])
+                continue
+            if file_exists(storage, remote_file_name):
+                print(f"File already exists: {remote_file_name}")
+                existing = Future()
+                existing.set_result(storage.public_url(remote_file_name))
+                seen[remote_file_name] = existing
+                uploads.append(existing)
+                continue
+
         # Download video
         local_file_name = f"video_{idx + 1}.mp4"
         if not download_video(video_url, local_file_name):
             continue
 
-        # Generate timestamped remote file name
-        remote_file_name = generate_timestamped_file_name(video_url, idx + 1)
-        
-        # Upload to Firebase if not already uploaded
-        uploaded_url = upload_video_to_firebase(bucket, local_file_name, remote_file_name)
-        uploaded_urls.append(uploaded_url)
+        # Generate a content-addressed remote file name and skip duplicates within the batch
+        remote_file_name = generate_content_addressed_file_name(local_file_name)
+        if remote_file_name in seen:
+            print(f"Duplicate of an earlier video: {video_url}")
+            os.remove(local_file_name)
+            uploads.append(seen[remote_file_name])
+            continue
 
-        # Clean up the local file
-        os.remove(local_file_name)
+        # Upload to Firebase in the background while the next video downloads,
+        # then clean up the local file
+        seen[remote_file_name] = tracing.submit(uploader.executor, upload_and_remove, storage, uploader,
+                                                local_file_name, remote_file_name)
+        uploads.append(seen[remote_file_name])
 
+    uploaded_urls = [upload.result() for upload in uploads]
+    uploader.close()
     return uploaded_urls
 
 if __name__ == "__main__":
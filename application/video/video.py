@@ -0,0 +1,112 @@
+import json
+import time
+
+from flask import Blueprint, Response, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from application.response import create_response
+from application.video.downloader import DownloadError, check_public_url
+from application.video.jobs import enqueue, is_finished, job_status
+from config import Config
+from models import VideoJob
+from models.user import db
+
+video = Blueprint('video', __name__)
+
+KEEP_ALIVE_INTERVAL = 15  # Seconds between SSE comments, so idle proxies keep the stream open
+
+
+def is_valid_video(info):
+    if not isinstance(info, dict) or not isinstance(info.get('url'), str):
+        return False
+    # No DNS lookups in the request: the worker resolves the host before fetching anything
+    try:
+        check_public_url(info['url'], Config.VIDEO_ALLOWED_HOSTS, resolve=False)
+    except DownloadError:
+        return False
+    return True
+
+
+def find_job(job_id, user_name):
+    return VideoJob.query.filter_by(id=job_id, submitted_by=user_name).first()
+
+
+# Queue videos for processing; the work happens in the job workers, never in this request
+@video.route('/jobs', methods=['POST'])
+@jwt_required()
+def submit_videos():
+    data = request.get_json(silent=True) or {}
+    videos = data.get('videos') or ([data] if 'url' in data else [])
+
+    # Validate value before processing
+    if isinstance(videos, list) and len(videos) > Config.VIDEO_SUBMIT_LIMIT:
+        return create_response(message=f"At most {Config.VIDEO_SUBMIT_LIMIT} videos per request", code=400)
+    if not videos or not isinstance(videos, list) or not all(is_valid_video(info) for info in videos):
+        return create_response(message="Please send a video url or a list of videos with public http(s) urls", code=400)
+
+    job_ids = enqueue(videos, submitted_by=get_jwt_identity())
+    return create_response(message="Videos queued", code=202, data={"job_ids": job_ids})
+
+
+# Poll the status of a job
+@video.route('/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    job = find_job(job_id, get_jwt_identity())
+    if not job:
+        return create_response(message="No job found", code=404)
+    return create_response(message="Get job status successfully", code=200, data=job_status(job))
+
+
+# Stream status changes as Server-Sent Events until the job finishes
+@video.route('/jobs/<int:job_id>/events', methods=['GET'])
+@jwt_required()
+def get_job_events(job_id):
+    user_name = get_jwt_identity()
+    if not find_job(job_id, user_name):
+        return create_response(message="No job found", code=404)
+
+    def events():
+        last_status = None
+        last_sent = time.monotonic()
+        while True:
+            job = find_job(job_id, user_name)
+            status = job_status(job) if job else None
+            finished = job is None or is_finished(job)
+            # End the transaction, so the next poll sees new commits and no connection is held while waiting
+            db.session.rollback()
+
+            if status is None:
+                yield "event: error\ndata: {\"message\": \"No job found\"}\n\n"
+                return
+            if status != last_status:
+                yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+                last_status = status
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > KEEP_ALIVE_INTERVAL:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            if finished:
+                yield f"event: done\ndata: {json.dumps({'status': status['status']})}\n\n"
+                return
+            time.sleep(Config.VIDEO_EVENTS_INTERVAL)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Fetch the final metadata of a processed video
+@video.route('/jobs/<int:job_id>/result', methods=['GET'])
+@jwt_required()
+def get_job_result(job_id):
+    job = find_job(job_id, get_jwt_identity())
+    if not job:
+        return create_response(message="No job found", code=404)
+
+    if job.status == 'completed':
+        return create_response(message="Get video metadata successfully", code=200, data=job.result)
+    if job.status == 'skipped':
+        return create_response(message="Video was skipped, it is shorter than 10 seconds", code=200)
+    if job.status == 'failed':
+        return create_response(message="Video processing failed", code=422, data={"error": job.error})
+    return create_response(message="Video is still processing", code=202, data=job_status(job))
@@ -0,0 +1,169 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+from multiprocessing import BoundedSemaphore, Event, Process
+
+from application.factory import create_app
+from application.video.downloader import check_public_url
+from application.video.ffmpeg_runner import init_worker
+from application.video.jobs import claim_job, complete_job, enqueue, extend_lease, fail_job, update_stage
+from application.video.process_video import MAX_CONCURRENT_ENCODES, process_video
+from config import Config
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class Heartbeat(threading.Thread):
+    """Renews the job lease while a long stage (e.g. the HLS ladder) is running."""
+
+    def __init__(self, app, job_id, worker_id, attempt, visibility_timeout):
+        super().__init__(daemon=True)
+        self.app = app
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.attempt = attempt
+        self.visibility_timeout = visibility_timeout
+        self.stopped = threading.Event()
+
+    def run(self):
+        # Its own app context, and so its own database session
+        with self.app.app_context():
+            while not self.stopped.wait(self.visibility_timeout / 3):
+                try:
+                    if not extend_lease(self.job_id, self.worker_id, self.attempt, self.visibility_timeout):
+                        logging.warning(f"Lost the lease on job {self.job_id}.")
+                        return
+                except Exception as e:
+                    logging.warning(f"Could not renew the lease on job {self.job_id}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run_job(app, job, worker_id, visibility_timeout):
+    job_id, attempt, stored_artifacts = job.id, job.attempts, job.artifacts
+    logging.info(f"Worker {worker_id} processing job {job_id} (attempt {attempt}/{job.max_attempts}): {job.url}")
+
+    def on_stage(stage, status, error=None, artifact=None):
+        if not update_stage(job_id, worker_id, attempt, stage, status, error, visibility_timeout, artifact):
+            raise LeaseLost(f"Job {job_id} was claimed by another worker")
+
+    heartbeat = Heartbeat(app, job_id, worker_id, attempt, visibility_timeout)
+    heartbeat.start()
+    try:
+        # Checked again, as the host may resolve differently than when the job was submitted
+        check_public_url(job.url, Config.VIDEO_ALLOWED_HOSTS)
+        result = process_video(job.video_info, on_stage=on_stage, public_only=True, stored_artifacts=stored_artifacts)
+    except LeaseLost as e:
+        logging.warning(str(e))
+        return
+    except Exception as e:
+        logging.error(f"Job {job_id} failed: {e}")
+        fail_job(job_id, worker_id, attempt, str(e))
+        return
+    finally:
+        heartbeat.stop()
+
+    if not complete_job(job_id, worker_id, attempt, result):
+        logging.warning(f"Job {job_id} finished after its lease was taken over; result discarded.")
+
+
+def work_loop(app, worker_id, stopping, visibility_timeout, poll_interval):
+    """Claim and run jobs until stopping is set."""
+    with app.app_context():
+        while not stopping.is_set():
+            try:
+                job = claim_job(worker_id, visibility_timeout)
+            except Exception as e:
+                logging.error(f"Could not claim a job: {e}")
+                job = None
+            if job is None:
+                stopping.wait(poll_interval)
+                continue
+            run_job(app, job, worker_id, visibility_timeout)
+
+
+def work(slots, stopping, visibility_timeout, poll_interval):
+    """Entry point of a worker process."""
+    # Ctrl+C reaches the whole process group; let the parent decide when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    init_worker(slots)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    work_loop(create_app(embedded_workers=False), worker_id, stopping, visibility_timeout, poll_interval)
+
+
+def start_embedded_workers(app, count, visibility_timeout=None, poll_interval=None,
+                           max_encodes=MAX_CONCURRENT_ENCODES):
+    """Run workers as threads of the web process, for development or single-node setups.
+
+    ffmpeg still runs in child processes, never in a request thread. Returns the Event
+    that stops them.
+    """
+    visibility_timeout = visibility_timeout or Config.JOB_VISIBILITY_TIMEOUT
+    poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+    init_worker(threading.BoundedSemaphore(max_encodes))
+    stopping = threading.Event()
+    for index in range(count):
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+        threading.Thread(target=work_loop, args=(app, worker_id, stopping, visibility_timeout, poll_interval),
+                         name=f"video-worker-{index}", daemon=True).start()
+    return stopping
+
+
+def run_workers(workers=None, visibility_timeout=None, poll_interval=None, max_encodes=MAX_CONCURRENT_ENCODES):
+    """Run worker processes on this node until SIGINT/SIGTERM; running jobs are finished first.
+
+    Start the same command on more machines pointed at the same database to scale out.
+    """
+    workers = workers or Config.VIDEO_WORKERS
+    visibility_timeout = visibility_timeout or Config.JOB_VISIBILITY_TIMEOUT
+    poll_interval = poll_interval or Config.JOB_POLL_INTERVAL
+    slots = BoundedSemaphore(max_encodes)
+    stopping = Event()
+
+    processes = [Process(target=work, args=(slots, stopping, visibility_timeout, poll_interval))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    def stop(signum, frame):
+        logging.info("Stopping workers after their current jobs...")
+        stopping.set()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    logging.info(f"Started {workers} video workers.")
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Video processing job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run worker processes")
+    run_parser.add_argument("--workers", type=int, default=Config.VIDEO_WORKERS)
+    run_parser.add_argument("--visibility-timeout", type=int, default=Config.JOB_VISIBILITY_TIMEOUT)
+    run_parser.add_argument("--poll-interval", type=float, default=Config.JOB_POLL_INTERVAL)
+    run_parser.add_argument("--max-encodes", type=int, default=MAX_CONCURRENT_ENCODES)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Queue videos from a JSON list of {\"url\": ...} objects")
+    enqueue_parser.add_argument("videos_file")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run_workers(args.workers, args.visibility_timeout, args.poll_interval, args.max_encodes)
+    else:
+        with open(args.videos_file) as f:
+            videos = json.load(f)
+        with create_app(embedded_workers=False).app_context():
+            job_ids = enqueue(videos)
+        logging.info(f"Queued {len(job_ids)} jobs: {job_ids}")
@@ -0,0 +1,241 @@
+"""Offline benchmark of the video pipeline.
+
+Synthesizes test videos with ffmpeg's testsrc, runs the probe, thumbnail, preview and
+upload stages against local or in-memory storage, and saves the timings as JSON so runs
+on different commits can be compared:
+
+    python -m benchmarks.pipeline_benchmark --repeat 3
+    python -m benchmarks.pipeline_benchmark --compare outputs/benchmarks/<earlier run>.json
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from application import tracing
+from application.video import probe as probe_module
+from application.video import process_video as pipeline
+from config import Config
+
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+VIDEOS_DIR = os.path.join(PROJECT_DIR, "outputs/benchmarks/videos")  # Synthesized once, reused across runs
+RESULTS_DIR = os.path.join(PROJECT_DIR, "outputs/benchmarks")
+STAGES = ["probe", "thumbnails", "previews", "upload"]
+
+# name, duration (s), width, height, video encoder, rotation
+CASES = [
+    ("h264_360p_15s", 15, 640, 360, "libx264", 0),
+    ("h264_720p_30s", 30, 1280, 720, "libx264", 0),
+    ("h264_1080p_60s", 60, 1920, 1080, "libx264", 0),
+    ("h264_portrait_1080p_30s", 30, 1080, 1920, "libx264", 0),
+    ("h264_rotated_720p_30s", 30, 1280, 720, "libx264", 90),
+    ("hevc_720p_30s", 30, 1280, 720, "libx265", 0),
+    ("vp9_720p_30s", 30, 1280, 720, "libvpx-vp9", 0),
+]
+
+
+def synthesize(case, output_dir=VIDEOS_DIR):
+    """Render a deterministic test video (testsrc pattern + sine tone) for a case, once."""
+    name, duration, width, height, encoder, rotation = case
+    extension = "webm" if encoder == "libvpx-vp9" else "mp4"
+    output_file = os.path.join(output_dir, f"{name}.{extension}")
+    if os.path.exists(output_file):
+        return output_file
+
+    os.makedirs(output_dir, exist_ok=True)
+    command = ['ffmpeg', '-y', '-v', 'error',
+               '-f', 'lavfi', '-i', f"testsrc=size={width}x{height}:rate=30:duration={duration}",
+               '-f', 'lavfi', '-i', f"sine=frequency=440:sample_rate=48000:duration={duration}",
+               '-c:v', encoder, '-g', '60', '-pix_fmt', 'yuv420p']
+    if encoder == "libvpx-vp9":
+        command += ['-deadline', 'realtime', '-cpu-used', '8', '-b:v', '1M', '-c:a', 'libopus']
+    else:
+        command += ['-preset', 'ultrafast', '-c:a', 'aac', '-movflags', '+faststart']
+    if rotation:
+        command += ['-metadata:s:v:0', f"rotate={rotation}"]
+    temporary_file = output_file + f".tmp.{extension}"
+    subprocess.run(command + [temporary_file], check=True)
+    os.replace(temporary_file, output_file)
+    return output_file
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def ffmpeg_version():
+    try:
+        output = subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, text=True).stdout
+    except OSError:
+        return None
+    return output.splitlines()[0] if output else None
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_case(case, video_file, work_dir):
+    """Run every stage once on a video; returns seconds and ffmpeg/ffprobe spawns per stage."""
+    name = case[0]
+    stages = {}
+    with tracing.trace("benchmark", case=name) as current:
+        def timed(stage, build):
+            before = current.counters.copy()
+            start = time.perf_counter()
+            with tracing.stage(stage):
+                value = build()
+            spawns = current.counters - before
+            stages[stage] = {
+                "seconds": time.perf_counter() - start,
+                "ffmpeg_spawns": spawns["ffmpeg_spawns"],
+                "ffprobe_spawns": spawns["ffprobe_spawns"]
+            }
+            return value
+
+        # Measure a cold probe, not the in-process memo
+        probe_module._cache.clear()
+        media = timed("probe", lambda: probe_module.probe(video_file))
+        thumbnails = timed("thumbnails", lambda: pipeline.generate_thumbnails(
+            video_file, name, media.duration, os.path.join(work_dir, "thumbnails")))
+        previews = timed("previews", lambda: pipeline.generate_preview_clips(
+            video_file, name, media.duration, media.has_audio, work_dir))
+        timed("upload", lambda: pipeline.uploader().upload(video_file, f"videos/{os.path.basename(video_file)}"))
+
+    return {
+        "case": name,
+        "duration": media.duration,
+        "width": media.display_width,
+        "height": media.display_height,
+        "codec": media.codec,
+        "thumbnails": sum(len(items) for items in thumbnails.values()),
+        "previews": len(previews),
+        "seconds": sum(stage["seconds"] for stage in stages.values()),
+        "ffmpeg_spawns": sum(stage["ffmpeg_spawns"] for stage in stages.values()),
+        "stages": stages
+    }
+
+
+def summarize(runs):
+    total_seconds = sum(run["seconds"] for run in runs)
+    thumbnail_seconds = sum(run["stages"]["thumbnails"]["seconds"] for run in runs)
+    summary = {
+        "videos": len(runs),
+        "videos_per_minute": len(runs) * 60 / total_seconds if total_seconds else None,
+        "thumbnails_per_second": (sum(run["thumbnails"] for run in runs) / thumbnail_seconds
+                                  if thumbnail_seconds else None),
+        "ffmpeg_spawns_per_video": sum(run["ffmpeg_spawns"] for run in runs) / len(runs) if runs else None,
+        "stages": {}
+    }
+    for stage in ["total"] + STAGES:
+        values = [run["seconds"] if stage == "total" else run["stages"][stage]["seconds"] for run in runs]
+        summary["stages"][stage] = {
+            "p50": percentile(values, 0.5),
+            "p90": percentile(values, 0.9),
+            "p99": percentile(values, 0.99),
+            "max": max(values) if values else None
+        }
+    return summary
+
+
+def compare(current, baseline):
+    """Print the relative change of the headline numbers against an earlier result file."""
+    def change(new, old):
+        if new is None or not old:
+            return "n/a"
+        return f"{(new - old) * 100 / old:+.1f}%"
+
+    old, new = baseline["summary"], current["summary"]
+    print(f"Compared with {baseline.get('commit')} ({baseline.get('timestamp')}):")
+    for key in ("videos_per_minute", "thumbnails_per_second", "ffmpeg_spawns_per_video"):
+        print(f"  {key}: {old.get(key)} -> {new.get(key)} ({change(new.get(key), old.get(key))})")
+    for stage, latencies in new["stages"].items():
+        previous = old["stages"].get(stage, {})
+        print(f"  {stage} p50: {change(latencies['p50'], previous.get('p50'))}, "
+              f"p90: {change(latencies['p90'], previous.get('p90'))}")
+
+
+def run_benchmark(cases=CASES, repeat=1, storage="memory", output_file=None):
+    # Keep the benchmark away from real buckets, and its metrics away from the pipeline's
+    Config.STORAGE_BACKEND = storage
+    work_root = tempfile.mkdtemp(prefix="benchmark_")
+    Config.LOCAL_STORAGE_DIR = os.path.join(work_root, "storage")
+    tracing.METRICS_FILE = os.path.join(work_root, "metrics.jsonl")
+    # Spawns are counted by the trace, so it stays on even when ENABLE_TRACING=0
+    tracing.ENABLE_TRACING = True
+
+    runs = []
+    try:
+        videos = [(case, synthesize(case)) for case in cases]
+        for iteration in range(repeat):
+            for case, video_file in videos:
+                work_dir = os.path.join(work_root, f"{case[0]}_{iteration}")
+                os.makedirs(work_dir)
+                run = run_case(case, video_file, work_dir)
+                run["iteration"] = iteration
+                runs.append(run)
+                logging.info(f"{case[0]} #{iteration}: {run['seconds']:.2f}s, {run['ffmpeg_spawns']} ffmpeg runs")
+                shutil.rmtree(work_dir)
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "ffmpeg": ffmpeg_version(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "storage": storage,
+            "repeat": repeat,
+            "thumbnail_interval": pipeline.THUMBNAIL_INTERVAL,
+            "thumbnail_sizes": pipeline.THUMBNAIL_SIZES,
+            "thumbnail_format": pipeline.THUMBNAIL_FORMAT,
+            "thumbnail_byte_budget": pipeline.THUMBNAIL_BYTE_BUDGET,
+            "preview_times": pipeline.PREVIEW_TIMES,
+            "preview_mode": pipeline.PREVIEW_MODE,
+            "upload_concurrency": pipeline.UPLOAD_CONCURRENCY
+        },
+        "runs": runs,
+        "summary": summarize(runs)
+    }
+
+    if output_file is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(RESULTS_DIR, f"{stamp}_{result['commit'] or 'unknown'}.json")
+    with open(output_file, 'w') as f:
+        json.dump(result, f, indent=4)
+    logging.info(f"Benchmark results saved to {output_file}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the video pipeline on synthesized videos")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per video")
+    parser.add_argument("--storage", choices=["memory", "local"], default="memory")
+    parser.add_argument("--cases", nargs="*", help="Only run these cases (see CASES)")
+    parser.add_argument("--output", help="Result file, defaults to outputs/benchmarks/<time>_<commit>.json")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    selected = [case for case in CASES if not args.cases or case[0] in args.cases]
+    result = run_benchmark(selected, args.repeat, args.storage, args.output)
+    print(json.dumps(result["summary"], indent=4))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
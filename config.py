@@ -11,3 +11,33 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('SECRET_KEY')
     DEBUG = os.getenv('FLASK_ENV') == 'development'
+
+    # Storage used by the processing scripts: "firebase", "local" or "memory"
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'firebase')
+    FIREBASE_STORAGE_BUCKET_NAME = os.getenv('FIREBASE_STORAGE_BUCKET_NAME', 'CHANGE YOUR STORAGE BUCKET HERE')
+    FIREBASE_CREDENTIALS_PATH = os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase-service-account-key.json')
+    LOCAL_STORAGE_DIR = os.getenv('LOCAL_STORAGE_DIR', 'outputs/storage')
+    LOCAL_STORAGE_PORT = int(os.getenv('LOCAL_STORAGE_PORT', '8001'))
+    LOCAL_STORAGE_URL = os.getenv('LOCAL_STORAGE_URL', f'http://localhost:{LOCAL_STORAGE_PORT}')
+
+    # Serve the pipeline metrics (outputs/metrics.jsonl) at /metrics in the Prometheus text format
+    ENABLE_METRICS_ENDPOINT = os.getenv('ENABLE_METRICS_ENDPOINT', '0') == '1'
+
+    # Video job queue, see application/video/worker.py
+    VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', '2'))  # Worker processes per node
+    VIDEO_EMBEDDED_WORKERS = int(os.getenv('VIDEO_EMBEDDED_WORKERS', '0'))  # Worker threads inside the Flask app
+    JOB_VISIBILITY_TIMEOUT = int(os.getenv('JOB_VISIBILITY_TIMEOUT', '600'))  # Seconds before a silent job is re-claimed
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', '60'))  # Seconds before a failed job is retried
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '2'))
+    VIDEO_SUBMIT_LIMIT = int(os.getenv('VIDEO_SUBMIT_LIMIT', '100'))  # Videos accepted per API request
+    VIDEO_EVENTS_INTERVAL = float(os.getenv('VIDEO_EVENTS_INTERVAL', '1'))  # Seconds between progress checks
+    # Comma-separated hosts that submitted videos may come from even on private addresses, e.g. "localhost"
+    # for the local storage server; every other host has to resolve to public addresses only
+    VIDEO_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv('VIDEO_ALLOWED_HOSTS', '').split(',') if host.strip()}
+
+    # Identity resolution for JWT-protected endpoints, see application/auth/identity.py
+    IDENTITY_CACHE_TTL = float(os.getenv('IDENTITY_CACHE_TTL', '60'))  # Seconds a cached user record stays valid
+    IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', '10000'))  # User records cached per process
+    # Put the user id and profile in the access token, so reads can skip the database entirely
+    JWT_PROFILE_CLAIMS = os.getenv('JWT_PROFILE_CLAIMS', '0') == '1'
@@ -1,2 +1,4 @@
+from .audio import AudioTrack
+from .job import VideoJob
 from .user import TransactionStatement
 from .user import User
@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from .user import db
+
+
+class AudioTrack(db.Model):
+    __tablename__ = 'audio_tracks'
+    # Prefix search (LIKE 'abc%'); on PostgreSQL the pattern ops make it work under any collation.
+    # The plain name index stays for ordering the results.
+    __table_args__ = (
+        db.Index('ix_audio_tracks_name_prefix', 'name', postgresql_ops={'name': 'varchar_pattern_ops'}),
+        db.Index('ix_audio_tracks_artist_prefix', 'artist', postgresql_ops={'artist': 'varchar_pattern_ops'}),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # "<extractor> <video id>" (e.g. "youtube <id>") for downloaded sources, "file <md5>" for local media
+    # files, "url <url>" when no extractor matches. A changed local file gets a new id.
+    source_id = db.Column(db.String(255), unique=True, nullable=False)
+    source = db.Column(db.String(2048), nullable=False)
+    file_hash = db.Column(db.String(32), nullable=True)  # MD5 (hex) of the uploaded MP3, not used for change detection
+    audio_url = db.Column(db.String(2048), nullable=False)
+    name = db.Column(db.String(512), nullable=False, index=True)
+    artist = db.Column(db.String(512), nullable=True)
+    duration = db.Column(db.Float, nullable=True)
+    thumbnail_url = db.Column(db.String(2048), nullable=True)
+    details = db.Column(db.JSON, nullable=False, default=dict)  # The full metadata record
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<AudioTrack {self.source_id}>"
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+from .user import db
+
+
+class VideoJob(db.Model):
+    __tablename__ = 'video_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    url = db.Column(db.String(2048), nullable=False)
+    video_info = db.Column(db.JSON, nullable=False)
+    submitted_by = db.Column(db.String(80), nullable=True, index=True)  # user_name of the API caller
+    # queued -> running -> completed / failed; a failed attempt goes back to queued until max_attempts
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)
+    # Per-stage progress, e.g. {"thumbnails": {"status": "completed", "updated_at": "..."}}
+    stages = db.Column(db.JSON, nullable=False, default=dict)
+    # Results of completed stages, {stage: {"params": <settings hash>, "value": ...}}, reused by retries
+    artifacts = db.Column(db.JSON, nullable=True)
+    result = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    worker_id = db.Column(db.String(120), nullable=True)
+    # The job is invisible to other workers until then; an expired lease means the worker died
+    locked_until = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<VideoJob {self.id} {self.status}>"
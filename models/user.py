@@ -6,6 +6,11 @@ db = SQLAlchemy()
 # Define a model
 class User(db.Model):
     __tablename__ = 'users'
+    # Prefix search (LIKE 'abc%'); on PostgreSQL the pattern ops make it work under any collation
+    __table_args__ = (
+        db.Index('ix_users_user_name_prefix', 'user_name', postgresql_ops={'user_name': 'varchar_pattern_ops'}),
+        db.Index('ix_users_email_prefix', 'email', postgresql_ops={'email': 'varchar_pattern_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_name = db.Column(db.String(80), unique=True, nullable=False)
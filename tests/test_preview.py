@@ -0,0 +1,42 @@
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from application.video import preview
+
+
+@unittest.skipUnless(shutil.which('ffmpeg') and shutil.which('ffprobe'), "needs ffmpeg and ffprobe")
+class CopyPreviewTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+        # A keyframe every second, so ranges on whole seconds start exactly on one
+        self.video_file = f"{self.work_dir}/source.mp4"
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25',
+                        '-f', 'lavfi', '-i', 'sine=frequency=440', '-t', '30', '-c:v', 'libx264', '-g', '25',
+                        '-sc_threshold', '0', '-c:a', 'aac', '-shortest', self.video_file], check=True)
+
+    def test_copy_cuts_every_range_in_one_ffmpeg_run(self):
+        with mock.patch.object(preview, 'run_ffmpeg', wraps=preview.run_ffmpeg) as run_ffmpeg:
+            clips = preview.create_previews(self.video_file, [(5, 10), (15, 20)], 30, f"{self.work_dir}/previews")
+
+        self.assertEqual(run_ffmpeg.call_count, 1)
+        self.assertEqual([(clip["start_time"], clip["end_time"]) for clip in clips], [(5, 10), (15, 20)])
+        for clip in clips:
+            self.assertAlmostEqual(clip["cut_start"], clip["start_time"], places=2)
+            self.assertEqual(clip["cut_end"], clip["end_time"])
+            duration = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0',
+                                       clip["file"]], stdout=subprocess.PIPE, check=True).stdout
+            self.assertAlmostEqual(float(duration), 5, delta=0.2)
+
+    def test_copy_reports_the_keyframe_before_an_unaligned_start(self):
+        clips = preview.create_previews(self.video_file, [(5.5, 8)], 30, f"{self.work_dir}/previews")
+
+        self.assertEqual(len(clips), 1)
+        self.assertAlmostEqual(clips[0]["cut_start"], 5, places=2)
+
+
+if __name__ == '__main__':
+    unittest.main()